@@ -1,4 +1,13 @@
+from collections import namedtuple
+import numpy as np
 from copy import deepcopy as copy
+from profiler import PROFILER
+from observation import ObservationEncoder
+from state_key import StateKey
+from reward_spec import DEFAULT_REWARD
+
+# Lightweight stand-in for a deep copied Floor when only its aggregate contributions are needed
+FloorSnapshot = namedtuple("FloorSnapshot", ["numOccupants", "comfort", "energyUsed"])
 
 class Building:
     def __init__(self, outsideTemperature):
@@ -11,12 +20,19 @@ class Building:
         self.floors = []
         self.totalEnergyUsed = 0
         self.averageComfort = 0
+        # Running sum and count behind averageComfort, only floors with occupants are counted
+        self.totalComfort = 0
+        self.floorsWithOccupants = 0
         self.outsideTemperature = outsideTemperature                
         self.expectedEnergyUsage = 0
+        # Single integer key for the joint state of all floors, updated by every Floor mutation
+        self.stateKey = StateKey()
 
 
     def addFloor(self, floor):
+        floor.floorNum = len(self.floors)
         self.floors.append(floor)        
+        self.stateKey.addFloor(floor)
         # Expected energy used assumes lights on for all floors and all floors at comfortable temp. This can likely be tweaked, as this is related to the goal state in the environment.
         self.expectedEnergyUsage = len(self.floors) * 0.5 + (len(self.floors) * (abs(self.outsideTemperature - 21) * 0.1))
         self.updateAverageComfort()        
@@ -38,28 +54,26 @@ class Building:
     def updateAverageComfort(self, floorUpdate=[]):
         # If no floorUpdate is passed in, update it based on all floors that have occupants
         if floorUpdate == []:
-            totalComfort = 0
-            floorsWithOccupants = 0
+            self.totalComfort = 0
+            self.floorsWithOccupants = 0
             for floor in self.floors:
                 if floor.comfort != -1:
-                    floorsWithOccupants += 1
-                    totalComfort += floor.comfort     
-            self.averageComfort = totalComfort / floorsWithOccupants
-        # If a specific floor is passed in, update it based only that floor
+                    self.floorsWithOccupants += 1
+                    self.totalComfort += floor.comfort     
+        # If a specific floor is passed in, swap that floor's old contribution for its new one.
+        # This keeps averageComfort an exact function of the floors rather than of the order of updates.
         else:
             prevFloor = floorUpdate[0]
             newFloor = floorUpdate[1]
-            numFloors = len(self.floors)
-
-            # NOTE: This average updating stuff hasnt been thoroughly tested... beware of bugs
-            # Only update comfort on the floor if the floor has occupants, or 
-            if newFloor.numOccupants > 0:
-                # Replaces old value in average with new value
-                self.averageComfort = (numFloors * self.averageComfort - prevFloor.comfort + newFloor.comfort) / numFloors
-            # if the floor previously had occupants but now has 0, remove it from averageComfort
-            if (prevFloor.numOccupants > 0 and newFloor.numOccupants == 0):
-                # Remove floor comfort from average
-                self.averageComfort = ((self.averageComfort * numFloors) - prevFloor.comfort) / (numFloors - 1)
+            if prevFloor.comfort != -1:
+                self.totalComfort -= prevFloor.comfort
+                self.floorsWithOccupants -= 1
+            if newFloor.comfort != -1:
+                self.totalComfort += newFloor.comfort
+                self.floorsWithOccupants += 1
+
+        # With nobody in the building there is no comfort to average
+        self.averageComfort = self.totalComfort / self.floorsWithOccupants if self.floorsWithOccupants > 0 else 0
 
     def getNumFloors(self):
         return len(self.floors)     
@@ -94,6 +108,8 @@ class Floor:
         self.lightStatus = lightStatus
         self.temperature = temperature
         self.outsideTemperature = outsideTemperature
+        # Index of the floor in building.floors, set when the floor is added to the building
+        self.floorNum = None
         # Energy used is measured in kW/h
         self.energyUsed = 0
         # Comfort of 0 is uncomfortable, 1 is medium comfort, 2 is high comfort. -1 is used when no occupants are on the floor, so that the comfort for that floor can be disregarded
@@ -137,14 +153,19 @@ class Floor:
         # Calculate energy used based on difference of floor temperature and outside temp
         self.energyUsed += (abs(self.outsideTemperature - self.temperature) * 0.1)
         
+    def snapshot(self):
+        return FloorSnapshot(self.numOccupants, self.comfort, self.energyUsed)
+
     def addOccupant(self):
         self.numOccupants += 1
+        self.building.stateKey.updateFloor(self.floorNum, self)
 
     def removeOccupant(self):
         self.numOccupants -= 1
+        self.building.stateKey.updateFloor(self.floorNum, self)
 
     def switchLights(self):
-        prev = copy(self)
+        prev = self.snapshot()
         self.lightStatus = not self.lightStatus
         self.calculateComfort()
         self.calculateEnergyUsage()
@@ -154,9 +175,10 @@ class Floor:
         self.building.updateAverageComfort(floorUpdate)
         # Update total building energy
         self.building.updateTotalEnergyUsed(floorUpdate)
+        self.building.stateKey.updateFloor(self.floorNum, self)
 
     def increaseTemp(self):
-        prev = copy(self)
+        prev = self.snapshot()
         self.temperature += 1
         self.calculateComfort()
         self.calculateEnergyUsage()
@@ -164,9 +186,10 @@ class Floor:
         floorUpdate = [prev,new]
         self.building.updateAverageComfort(floorUpdate)
         self.building.updateTotalEnergyUsed(floorUpdate)
+        self.building.stateKey.updateFloor(self.floorNum, self)
 
     def decreaseTemp(self):
-        prev = copy(self)
+        prev = self.snapshot()
         self.temperature -= 1
         self.calculateComfort()
         self.calculateEnergyUsage()
@@ -174,16 +197,71 @@ class Floor:
         floorUpdate = [prev,new]
         self.building.updateAverageComfort(floorUpdate)
         self.building.updateTotalEnergyUsed(floorUpdate)
+        self.building.stateKey.updateFloor(self.floorNum, self)
+
+    def setOccupants(self, numOccupants):
+        # Used by the occupancy simulation, keeps comfort and the building aggregates in sync unlike add/removeOccupant
+        prev = self.snapshot()
+        self.numOccupants = numOccupants
+        self.calculateComfort()
+        new = self
+        floorUpdate = [prev,new]
+        self.building.updateAverageComfort(floorUpdate)
+        self.building.stateKey.updateFloor(self.floorNum, self)
+
+    def setTemperature(self, temperature):
+        # Used when the temperature drifts on its own, e.g. from the thermal model
+        prev = self.snapshot()
+        self.temperature = temperature
+        self.calculateComfort()
+        self.calculateEnergyUsage()
+        new = self
+        floorUpdate = [prev,new]
+        self.building.updateAverageComfort(floorUpdate)
+        self.building.updateTotalEnergyUsed(floorUpdate)
+        self.building.stateKey.updateFloor(self.floorNum, self)
+
+
+# Dispatch table from actionNum to the Floor method applying it, any other actionNum (e.g. 0) is a no-op
+FLOOR_ACTIONS = {1: Floor.switchLights, 2: Floor.increaseTemp, 3: Floor.decreaseTemp}
         
 
 class Environment:
-    def __init__(self, building):
+    def __init__(self, building, thermalModel=None, occupancySimulator=None, rewardSpec=None, buildingFactory=None, snapshotChannel=None):
+        """
+        Initializes the environment around a building.
+
+        Args:
+            building (Building): The building being controlled.
+            thermalModel (ThermalModel): Optional heat transfer model, floor temperatures then also drift towards the outside
+                temperature, neighbouring floors and occupant heat after every action.
+            occupancySimulator (OccupancySimulator): Optional occupancy simulation, advanced by one step of simulated time per step.
+                The simulated time keeps running across resets.
+            rewardSpec (RewardSpec): Reward evaluated after every step, defaults to DEFAULT_REWARD.
+            buildingFactory (callable): Returns the fresh Building reset() starts each episode from, defaults to Building.resetBuilding.
+            snapshotChannel (SnapshotChannel): Optional channel the building is published to after every step and reset, e.g. for
+                the GUI process. The channel throttles publishing itself.
+        """
         self.building = building
         self.startingState = copy(building) # Create copy of memory so when changes to building occur we still retain the original building
 
         # Used to track how many actions have been taken since the start of the run.
         self.numStepsTaken = 0
         self.terminated = False
+        # True when the episode ended because of the step limit rather than by reaching the goal, learners should bootstrap then
+        self.truncated = False
+        self.rewardSpec = DEFAULT_REWARD if rewardSpec is None else rewardSpec
+        self.buildingFactory = buildingFactory
+        self.snapshotChannel = snapshotChannel
+        # Discrete indices and dense features for the current building, kept in sync by step() and reset()
+        self.observation = ObservationEncoder(building)
+        self.occupancySimulator = occupancySimulator
+        if occupancySimulator is not None:
+            occupancySimulator.apply(building)
+            self.observation.reset(building)
+        self.thermalModel = thermalModel
+        if thermalModel is not None:
+            thermalModel.reset(building)
 
         self.actionSpace = []
         self.numActions = 0
@@ -192,50 +270,42 @@ class Environment:
             self.numActions += 3
             floorActions = [1,2,3]
             self.actionSpace.append(floorActions)
+        # Flat action index -> [floorNum, actionNum], for agents that pick one of the numActions actions directly
+        self.flatActions = [[floorNum, actionNum] for floorNum in range(len(building.floors)) for actionNum in FLOOR_ACTIONS]
 
         print(self.numActions)
         print(self.actionSpace)
 
-    # NOTE: This function's logic/values may need tweaking upon testing!
-    def computeReward(self, prevState):
-        totalReward = 0
-
-        # Increase rewards
-        # Did action improve on state, i.e. get closer to end goal?
-        if prevState.averageComfort < self.building.averageComfort:
-            totalReward += 0.1
-        if prevState.totalEnergyUsed > self.building.totalEnergyUsed:
-            totalReward += 0.1
-        # Did action reach an optimal state? big reward
-        if (self.building.totalEnergyUsed < self.building.expectedEnergyUsage):
-            totalReward += 1
-        if (self.building.averageComfort > 1.5):
-            totalReward += 1
-        
-        # Decrease rewards
-        # If building is less than high comfort but higher than uncomfortable, drop rewards if comfort continues to decrease. No need to punish if comfort drops when its already in a high state.
-        if self.building.averageComfort < 2 and self.building.averageComfort > 1:
-            if prevState.averageComfort > self.building.averageComfort:
-                totalReward -= 0.1
-        # If the building average comfort is uncomfortable, bigger punishment
-        elif self.building.averageComfort < 1:
-            totalReward -= 1
-
-        if prevState.totalEnergyUsed < self.building.totalEnergyUsed:
-            # If the difference between the totalEnergyUSed and the expectedEnergyUsage is greater or equal to 2 kW/h, bigger punishment 
-            # NOTE 2 is an arbitrary value, this may need tweaking!!
-            if (self.building.totalEnergyUsed - self.building.expectedEnergyUsage) > 2:
-                totalReward -= 1
-            # Otherwise, minor punishment for when action increases energy usage.
-            else:
-                totalReward -= 0.1
-            
-        return totalReward
+    def config(self):
+        """
+        Keyword arguments that build an equivalent fresh Environment, e.g. Environment(**env.config()) in a worker process.
+        The building is the starting one and the snapshot channel is left out, only the training process publishes.
+        """
+        return {
+            "building": self.startingState,
+            "thermalModel": self.thermalModel,
+            "occupancySimulator": self.occupancySimulator,
+            "rewardSpec": self.rewardSpec,
+            "buildingFactory": self.buildingFactory,
+        }
+
+    def computeReward(self, prevComfort, prevEnergy):
+        # The reward rules live in self.rewardSpec, see DEFAULT_REWARD_TERMS for the default ones
+        building = self.building
+        return self.rewardSpec(prevComfort, prevEnergy, building.averageComfort, building.totalEnergyUsed, building.expectedEnergyUsage)
     
     def reset(self):
         self.numStepsTaken = 0
         self.terminated = False
-        self.building = Building.resetBuilding(self.building)
+        self.truncated = False
+        self.building = Building.resetBuilding(self.building) if self.buildingFactory is None else self.buildingFactory()
+        if self.occupancySimulator is not None:
+            self.occupancySimulator.apply(self.building)
+        self.observation.reset(self.building)
+        if self.thermalModel is not None:
+            self.thermalModel.reset(self.building)
+        if self.snapshotChannel is not None:
+            self.snapshotChannel.publish(self.building)
 
         return self.building
     
@@ -247,28 +317,97 @@ class Environment:
         # This is to truncate runs after 500 steps.
         elif (self.numStepsTaken > 500):
             self.terminated = True
+            self.truncated = True
             return self.terminated
         
         return False
 
+    def applyThermal(self, floorActions):
+        model = self.thermalModel
+        # The agent's own temperature changes act on the model's continuous temperatures too
+        for floorNum, actionNum in floorActions:
+            if actionNum == 2:
+                model.nudge(floorNum, 1)
+            elif actionNum == 3:
+                model.nudge(floorNum, -1)
+        floors = self.building.floors
+        occupants = np.fromiter((floor.numOccupants for floor in floors), dtype=np.float64, count=len(floors))
+        changed, temperatures = model.advance(self.building.outsideTemperature, occupants)
+        # Only floors whose whole-degree temperature moved go through the Floor update path
+        for i, temperature in zip(changed, temperatures):
+            floors[i].setTemperature(int(temperature))
+            self.observation.updateFloor(i)
+
     def step(self, action):
         self.numStepsTaken += 1
-        prevState = copy(self.building)
         floorNum, actionNum = action
 
-        if actionNum == 0:
-            #Do nothing
-            pass
-        elif actionNum ==1:     
-            self.building.floors[floorNum].switchLights()
-        elif actionNum == 2:
-            self.building.floors[floorNum].increaseTemp()
-        elif actionNum == 3:
-            self.building.floors[floorNum].decreaseTemp()
+        # The reward only compares the building aggregates before and after the step, no need to copy the whole building
+        prevComfort = self.building.averageComfort
+        prevEnergy = self.building.totalEnergyUsed
+
+        with PROFILER.phase("apply_action"):
+            floorAction = FLOOR_ACTIONS.get(actionNum)
+            if floorAction is not None:
+                floorAction(self.building.floors[floorNum])
+            self.observation.updateFloor(floorNum)
+
+        self.advanceDynamics(((floorNum, actionNum),))
 
         self.terminated = self.isEpisodeFinished()
-        reward = self.computeReward(prevState) if not self.terminated else 0
+        with PROFILER.phase("reward"):
+            reward = self.computeReward(prevComfort, prevEnergy) if not self.terminated else 0
+        if self.snapshotChannel is not None:
+            self.snapshotChannel.publish(self.building)
 
         #next_state, reward, terminated
         return self.building, reward, self.terminated
 
+    def stepFloors(self, actionNums):
+        """
+        Factored step: applies one actionNum to every floor at once (0 leaves a floor alone), then advances occupancy and the
+        thermal model, checks termination and computes the reward a single time for the whole control tick. algo1_factored
+        trains on it.
+
+        Args:
+            actionNums (sequence): One actionNum per floor, indexed by floorNum.
+
+        Returns:
+            next_state, reward, terminated like step().
+        """
+        self.numStepsTaken += 1
+        prevComfort = self.building.averageComfort
+        prevEnergy = self.building.totalEnergyUsed
+
+        with PROFILER.phase("apply_action"):
+            floors = self.building.floors
+            floorActions = []
+            for floorNum, actionNum in enumerate(actionNums):
+                floorAction = FLOOR_ACTIONS.get(actionNum)
+                if floorAction is not None:
+                    floorAction(floors[floorNum])
+                    self.observation.updateFloor(floorNum)
+                    floorActions.append((floorNum, actionNum))
+
+        self.advanceDynamics(floorActions)
+
+        self.terminated = self.isEpisodeFinished()
+        with PROFILER.phase("reward"):
+            reward = self.computeReward(prevComfort, prevEnergy) if not self.terminated else 0
+        if self.snapshotChannel is not None:
+            self.snapshotChannel.publish(self.building)
+
+        return self.building, reward, self.terminated
+
+    def advanceDynamics(self, floorActions):
+        # Everything that changes the building on its own within a step, after the agent's (floorNum, actionNum) actions
+        if self.occupancySimulator is not None:
+            with PROFILER.phase("occupancy"):
+                # Only floors whose occupant count changed over the step are updated
+                for changedFloor in self.occupancySimulator.apply(self.building, self.occupancySimulator.advance()):
+                    self.observation.updateFloor(changedFloor)
+
+        if self.thermalModel is not None:
+            with PROFILER.phase("thermal"):
+                self.applyThermal(floorActions)
+
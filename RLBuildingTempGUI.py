@@ -1,6 +1,7 @@
 import pygame
 import pygame_gui
-import queue
+import time
+from snapshot_channel import SnapshotChannel
 
 def drawScene(buildingInfo, manager,buildingDetails):
 
@@ -142,7 +143,17 @@ def drawUpdates(screen, buildingInfo,manager, buildingDetails):
     #draw the sun
     pygame.draw.circle(screen, sunHue, (screen.get_width() - 50, 50), 30)
 
-def runGUI(buildingInfo, gui_queue):
+def runGUI(channelName, numFloors):
+
+    #attach to the trainer's snapshot channel and wait for the first snapshot, the GUI runs in its own process
+    channel = SnapshotChannel(numFloors, name=channelName)
+    buildingInfo = channel.readBuilding()
+    while buildingInfo is None and not channel.closed:
+        time.sleep(0.01)
+        buildingInfo = channel.readBuilding()
+    if buildingInfo is None:
+        channel.close()
+        return
     
     #init pygame
     pygame.init()
@@ -242,18 +253,16 @@ def runGUI(buildingInfo, gui_queue):
             #process events
             manager.process_events(event)
 
-        try:
-            # Check for updates from the algorithm
-            update = gui_queue.get_nowait()
-            if update is None:
-                applicationRunning = False
-            else:
-                # Update the building state
+        # Check for a newer snapshot from training, training closes the channel when it is done.
+        # Button changes only affect this process's copy of the building until the next snapshot replaces it
+        if channel.closed:
+            applicationRunning = False
+        else:
+            update = channel.readBuilding()
+            if update is not None:
                 buildingInfo = update
                 manager.clear_and_reset()  # Clear UI before redrawing
                 dataLabels, adjustButtons = drawScene(buildingInfo, manager, buildingDetails)
-        except queue.Empty:
-            pass
 
         #update the timers
         manager.update(timer)
@@ -267,5 +276,6 @@ def runGUI(buildingInfo, gui_queue):
         #update the display
         pygame.display.update()
 
+    channel.close()
     pygame.quit()
 
@@ -4,17 +4,25 @@ from algo2 import algo2
 from algo3 import algo3
 from plot_results import plot_rewards
 import numpy as np
-import threading
-import queue
+import multiprocessing as mp
 from RLBuildingTempGUI import runGUI
+from snapshot_channel import SnapshotChannel
 import pygame
-import time
 import os
+import sys
+from profiler import PROFILER
+from evaluation import evaluatePolicy, formatReport
 
-def run_algorithm(algo, env, hyperparameters, gui_queue):
+def run_algorithm(algo, env, hyperparameters, gui_channel, profile=False):
     env.reset()
+    # Per-phase timings are collected across the whole hyperparameter sweep of this algorithm
+    if profile:
+        PROFILER.reset()
+        PROFILER.enable()
     
     rewards_list = []
+    # Learned Q tables / policy parameters of every run, for greedy evaluation afterwards
+    artifacts = []
     for params in hyperparameters:
         # Remove gui_queue from params before passing to algorithms
         algo_params = params.copy()  # Create a copy to avoid modifying original
@@ -22,23 +30,30 @@ def run_algorithm(algo, env, hyperparameters, gui_queue):
             del algo_params['gui_queue']
             
         if algo.__name__ == 'algo1':
-            _, rewards = algo(env, **algo_params)
+            Q, rewards = algo(env, **algo_params)
+            artifacts.append(Q)
         elif algo.__name__ == 'algo2':
-            _, _, rewards = algo(env, **algo_params)
+            Q1, Q2, rewards = algo(env, **algo_params)
+            artifacts.append((Q1, Q2))
         elif algo.__name__ == 'algo3':
-            _, rewards = algo(env, **algo_params)
+            theta, rewards = algo(env, **algo_params)
+            artifacts.append(theta)
         rewards_list.append(rewards)
         
-        # Update GUI after each episode if needed
-        if gui_queue is not None:
-            gui_queue.put(env.building)
+        # Make sure the GUI shows the final state of each run, the environment's own publishes are throttled
+        if gui_channel is not None:
+            gui_channel.publish(env.building, force=True)
+
+    if profile:
+        PROFILER.disable()
+        print(f"Profile for {algo.__name__}:")
+        print(PROFILER.table())
+        # Folded stacks can be rendered with flamegraph.pl or speedscope
+        PROFILER.dump(f"{algo.__name__}_profile.folded")
             
-    return rewards_list
+    return rewards_list, artifacts
 
-def gui_thread(building, gui_queue):
-    runGUI(building, gui_queue)
-
-def main():
+def main(profile=False, evaluate=False):
     # Ensure theme.json exists in the current directory
     if not os.path.exists('theme.json'):
         print("Warning: theme.json not found. Creating default theme file...")
@@ -56,17 +71,15 @@ def main():
     building.addFloor(floor2)
     building.addFloor(floor3)
 
-    env = Environment(building)
-
-    # Create a queue for GUI updates
-    gui_queue = queue.Queue()
-
-    # Start GUI thread
-    gui_thread_instance = threading.Thread(target=gui_thread, args=(building, gui_queue), daemon=True)
-    gui_thread_instance.start()
+    # The GUI runs in its own process and reads throttled building snapshots from shared memory,
+    # so rendering never competes with training for the GIL
+    gui_channel = SnapshotChannel(building.getNumFloors())
+    env = Environment(building, snapshotChannel=gui_channel)
+    gui_channel.publish(building, force=True)
 
-    # Give the GUI thread a moment to initialize
-    time.sleep(1)
+    # Start GUI process
+    gui_process = mp.Process(target=runGUI, args=(gui_channel.name, building.getNumFloors()), daemon=True)
+    gui_process.start()
 
     # Hyperparameters for each algorithm
     algo1_hyperparameters = [
@@ -90,11 +103,11 @@ def main():
     try:
         # Run algorithms with different hyperparameters
         print("Running algorithm 1 (Q-learning)...")
-        algo1_rewards = run_algorithm(algo1, env, algo1_hyperparameters, gui_queue)
+        algo1_rewards, algo1_artifacts = run_algorithm(algo1, env, algo1_hyperparameters, gui_channel, profile)
         print("Running algorithm 2 (Soft Actor-Critic)...")
-        algo2_rewards = run_algorithm(algo2, env, algo2_hyperparameters, gui_queue)
+        algo2_rewards, algo2_artifacts = run_algorithm(algo2, env, algo2_hyperparameters, gui_channel, profile)
         print("Running algorithm 3 (Policy Gradient)...")
-        algo3_rewards = run_algorithm(algo3, env, algo3_hyperparameters, gui_queue)
+        algo3_rewards, algo3_artifacts = run_algorithm(algo3, env, algo3_hyperparameters, gui_channel, profile)
 
         # Plot results
         plot_rewards(algo1_rewards, algo1_hyperparameters, title="Algorithm 1 (Q-learning) Performance")
@@ -102,15 +115,22 @@ def main():
         plot_rewards(algo3_rewards, algo3_hyperparameters, title="Algorithm 3 (Policy Gradient) Performance")
 
         # Find best hyperparameters for each algorithm
-        for algo_name, rewards, hyperparams in [
-            ("Algorithm 1 (Q-learning)", algo1_rewards, algo1_hyperparameters),
-            ("Algorithm 2 (Soft Actor-Critic)", algo2_rewards, algo2_hyperparameters),
-            ("Algorithm 3 (Policy Gradient)", algo3_rewards, algo3_hyperparameters)
+        for algo_name, rewards, artifacts, hyperparams in [
+            ("Algorithm 1 (Q-learning)", algo1_rewards, algo1_artifacts, algo1_hyperparameters),
+            ("Algorithm 2 (Soft Actor-Critic)", algo2_rewards, algo2_artifacts, algo2_hyperparameters),
+            ("Algorithm 3 (Policy Gradient)", algo3_rewards, algo3_artifacts, algo3_hyperparameters)
         ]:
             best_performance = float('-inf')
             best_params = None
-            for rewards, params in zip(rewards, hyperparams):
-                avg_reward = np.mean(rewards[-50:])  # Average of last 50 episodes
+            for rewards, artifact, params in zip(rewards, artifacts, hyperparams):
+                if evaluate:
+                    # Mean reward of the greedy policy on seeded scenarios instead of the noisy exploratory training rewards
+                    report = evaluatePolicy(artifact)
+                    print(f"{algo_name} - {params}")
+                    print(formatReport(report))
+                    avg_reward = report["reward"]["mean"]
+                else:
+                    avg_reward = np.mean(rewards[-50:])  # Average of last 50 episodes
                 if avg_reward > best_performance:
                     best_performance = avg_reward
                     best_params = params
@@ -118,14 +138,16 @@ def main():
             print(f"{algo_name} - Best Average Reward: {best_performance}")
 
     finally:
-        # Signal GUI thread to stop
-        gui_queue.put(None)
-        gui_thread_instance.join(timeout=1)  # Wait for up to 1 second for the GUI thread to finish
+        # Signal GUI process to stop
+        gui_channel.close()
+        gui_process.join(timeout=1)  # Wait for up to 1 second for the GUI process to finish
 
     print(f"External Temperature: {outsideTemp}, Total Building Energy Consumption: {building.totalEnergyUsed:.2f}, Average Building Comfort: {building.averageComfort:.2f}")
 
 if __name__ == "__main__":
-    main()
+    # Run with --profile to print and dump a per-phase time breakdown for each algorithm,
+    # and with --evaluate to pick hyperparameters by greedy evaluation on seeded scenarios
+    main(profile="--profile" in sys.argv, evaluate="--evaluate" in sys.argv)
 
 
 
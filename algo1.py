@@ -1,50 +1,266 @@
 import numpy as np
 import random
+import multiprocessing as mp
+import queue
+from multiprocessing import shared_memory
+from profiler import PROFILER
+from Environment import Environment, FLOOR_ACTIONS
+from tile_coding import TileCoder, SparseLinear
 
-def algo1(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, epsilon=0.1):
-    num_floors = env.building.getNumFloors()
-    num_actions = env.numActions
-    Q = np.zeros((num_floors, 2, 3, num_actions))
-    
-    total_rewards = []
+def replay_update(Q_flat, replayBuffer, batchSize, gamma, stepSize, convergence=None):
+    # Vectorized Q-learning TD update over a minibatch of stored transitions. Like the online update below it bootstraps through terminal states
+    indices, s, a, r, s_next, dones, weights = replayBuffer.sample(batchSize)
+    td_target = r + gamma * np.max(Q_flat[s_next], axis=1)
+    td_error = td_target - Q_flat[s, a]
+    updates = stepSize * weights * td_error
+    if convergence is not None:
+        greedy_before = np.argmax(Q_flat[s], axis=1)
+    # np.add.at accumulates repeated (state, action) pairs instead of keeping only the last write
+    np.add.at(Q_flat, (s, a), updates)
+    if convergence is not None:
+        convergence.updateBatch(updates, np.count_nonzero(np.argmax(Q_flat[s], axis=1) != greedy_before))
+    replayBuffer.updatePriorities(indices, td_error)
 
-    for episode in range(maxEpisodes):
-        state = env.reset()
-        episode_reward = 0
-        step_count = 0
+def run_episode(env, Q, Q_flat, episode, gamma, stepSize, epsilon, recorder=None, replayBuffer=None, batchSize=32, convergence=None):
+    # One epsilon-greedy Q-learning episode, updating Q in place. Shared by algo1 and the algo1_parallel workers
+    num_floors, _, _, num_actions = Q.shape
+    obs = env.observation
+    env.reset()
+    episode_reward = 0
+    step_count = 0
 
-        while not env.terminated:
+    while not env.terminated:
+        with PROFILER.phase("select_action"):
             floor = random.randint(0, num_floors - 1)
-            light_status = 1 if state.floors[floor].lightStatus else 0
-            temp_status = 0 if state.floors[floor].temperature < 20 else (1 if state.floors[floor].temperature < 23 else 2)
+            _, light_status, temp_status = obs.floorIndex(floor)
             
             if random.uniform(0, 1) < epsilon:
                 action_num = random.randint(0, num_actions - 1)
             else:
                 action_num = np.argmax(Q[floor, light_status, temp_status])
 
-            action = [floor, action_num]
+        action = [floor, action_num]
+        with PROFILER.phase("env_step"):
             next_state, reward, terminated = env.step(action)
-            episode_reward += reward
+        episode_reward += reward
+        if recorder is not None:
+            with PROFILER.phase("logging"):
+                recorder.record(episode, step_count, action, reward, terminated, next_state)
 
-            next_light_status = 1 if next_state.floors[floor].lightStatus else 0
-            next_temp_status = 0 if next_state.floors[floor].temperature < 20 else (1 if next_state.floors[floor].temperature < 23 else 2)
+        with PROFILER.phase("td_update"):
+            _, next_light_status, next_temp_status = obs.floorIndex(floor)
 
             best_next_value = np.max(Q[floor, next_light_status, next_temp_status])
             td_target = reward + gamma * best_next_value
-            Q[floor, light_status, temp_status, action_num] += stepSize * (td_target - Q[floor, light_status, temp_status, action_num])
+            update = stepSize * (td_target - Q[floor, light_status, temp_status, action_num])
+            if convergence is not None:
+                greedy_before = np.argmax(Q[floor, light_status, temp_status])
+            Q[floor, light_status, temp_status, action_num] += update
+            if convergence is not None:
+                convergence.update(update, np.argmax(Q[floor, light_status, temp_status]) != greedy_before)
 
-            state = next_state
-            step_count += 1
+            if replayBuffer is not None:
+                state_idx = np.ravel_multi_index((floor, light_status, temp_status), Q.shape[:3])
+                next_state_idx = np.ravel_multi_index((floor, next_light_status, next_temp_status), Q.shape[:3])
+                replayBuffer.add(state_idx, action_num, reward, next_state_idx, terminated)
+                if len(replayBuffer) >= batchSize:
+                    replay_update(Q_flat, replayBuffer, batchSize, gamma, stepSize, convergence)
+
+        step_count += 1
+
+        if step_count >= 500: #safeguard against infinite loops
+            break
+
+    return episode_reward, step_count
+
+def algo1(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, epsilon=0.1, recorder=None, replayBuffer=None, batchSize=32, convergence=None, initialQ=None):
+    # Pass a ConvergenceMonitor as convergence to stop early once Q stops changing, its stopEpisode says when.
+    # initialQ warm-starts Q instead of zeros, e.g. from transfer.warmStart
+    num_floors = env.building.getNumFloors()
+    num_actions = env.numActions
+    Q = np.zeros((num_floors, 2, 3, num_actions))
+    if initialQ is not None:
+        Q[:] = initialQ
+    # Flat (state index, action) view of Q used by the replay minibatch updates
+    Q_flat = Q.reshape(-1, num_actions)
+    
+    total_rewards = []
 
+    for episode in range(maxEpisodes):
+        episode_reward, step_count = run_episode(env, Q, Q_flat, episode, gamma, stepSize, epsilon, recorder, replayBuffer, batchSize, convergence)
+        total_rewards.append(episode_reward)
+
+        if episode % 10 == 0:
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+
+        if convergence is not None and convergence.endEpisode():
+            print(f"Converged, stopping after episode {episode}")
+            break
+
+    return Q, total_rewards
+
+def hogwild_worker(worker_id, shm_name, shape, env_config, num_episodes, gamma, stepSize, epsilon, seed, reward_queue):
+    # Each worker owns its own Environment, built from the caller's env.config(), and writes straight into the shared Q table without any locking
+    shm = shared_memory.SharedMemory(name=shm_name)
+    Q = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    random.seed(seed)
+    np.random.seed(seed)
+    env = Environment(**env_config)
+
+    try:
+        for episode in range(num_episodes):
+            episode_reward, step_count = run_episode(env, Q, Q.reshape(-1, shape[-1]), episode, gamma, stepSize, epsilon)
+            reward_queue.put((worker_id, episode, episode_reward, step_count))
+    finally:
+        del Q
+        shm.close()
+
+def get_from_workers(result_queue, workers, timeout=1.0):
+    # Waits for the next worker result, raising instead of blocking forever once a worker died or every worker exited
+    while True:
+        try:
+            return result_queue.get(timeout=timeout)
+        except queue.Empty:
+            for process in workers:
+                if not process.is_alive() and process.exitcode != 0:
+                    raise RuntimeError(f"Worker process {process.pid} died with exit code {process.exitcode}")
+            if not any(process.is_alive() for process in workers):
+                raise RuntimeError("All worker processes exited before sending every result")
+
+def algo1_parallel(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, epsilon=0.1, numWorkers=None, seed=None):
+    #Hogwild-style asynchronous Q-learning: numWorkers processes share one Q table and split maxEpisodes between them.
+    #Workers train on fresh copies of env built from env.config(), so buildingFactory, rewardSpec and the dynamics models carry over.
+    #The TD updates are single element writes to a tiny table, so occasional lost updates from races are tolerated instead of locking.
+    num_floors = env.building.getNumFloors()
+    num_actions = env.numActions
+    numWorkers = numWorkers or mp.cpu_count()
+    shape = (num_floors, 2, 3, num_actions)
+    seed = random.randrange(2**31) if seed is None else seed
+
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.float64).itemsize)
+    Q_shared = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    Q_shared[:] = 0
+    reward_queue = mp.Queue()
+
+    episodes_per_worker = [maxEpisodes // numWorkers + (1 if w < maxEpisodes % numWorkers else 0) for w in range(numWorkers)]
+    workers = []
+    for w in range(numWorkers):
+        process = mp.Process(target=hogwild_worker, args=(w, shm.name, shape, env.config(), episodes_per_worker[w],
+                                                          gamma, stepSize, epsilon, seed + w, reward_queue), daemon=True)
+        process.start()
+        workers.append(process)
+
+    #merge every worker's episodes into one stream, in the order they finish
+    total_rewards = []
+    try:
+        for episode in range(sum(episodes_per_worker)):
+            worker_id, _, episode_reward, step_count = get_from_workers(reward_queue, workers)
+            total_rewards.append(episode_reward)
+            if episode % 10 == 0:
+                print(f"Episode {episode}, Worker {worker_id}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+        for process in workers:
+            process.join()
+        Q = Q_shared.copy()
+    finally:
+        #only still running if training failed, e.g. another worker died
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        del Q_shared
+        shm.close()
+        shm.unlink()
+
+    return Q, total_rewards
+
+def algo1_factored(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, epsilon=0.1):
+    #Q-learning on the factored action space: every control tick each floor picks its own action 0 (nothing) to 3 from its
+    #(light, temperature bucket) row and env.stepFloors applies them together, so an episode takes about num_floors times fewer
+    #steps than algo1. Floors are independent learners of the shared reward, updated in one vectorized pass per tick
+    num_floors = env.building.getNumFloors()
+    num_actions = len(FLOOR_ACTIONS) + 1
+    Q = np.zeros((num_floors, 2, 3, num_actions))
+    floors = np.arange(num_floors)
+    obs = env.observation
+
+    total_rewards = []
+
+    for episode in range(maxEpisodes):
+        env.reset()
+        episode_reward = 0
+        step_count = 0
+
+        while not env.terminated:
+            with PROFILER.phase("select_action"):
+                light_status = obs.lightIndex.astype(np.intp)
+                temp_status = obs.tempIndex.astype(np.intp)
+                action_nums = np.argmax(Q[floors, light_status, temp_status], axis=1)
+                explore = np.random.random_sample(num_floors) < epsilon
+                action_nums[explore] = np.random.randint(num_actions, size=np.count_nonzero(explore))
+
+            with PROFILER.phase("env_step"):
+                _, reward, terminated = env.stepFloors(action_nums)
+            episode_reward += reward
+
+            with PROFILER.phase("td_update"):
+                best_next_values = np.max(Q[floors, obs.lightIndex, obs.tempIndex], axis=1)
+                td_target = reward + gamma * best_next_values
+                Q[floors, light_status, temp_status, action_nums] += stepSize * (td_target - Q[floors, light_status, temp_status, action_nums])
+
+            step_count += 1
             if step_count >= 500: #safeguard against infinite loops
                 break
 
         total_rewards.append(episode_reward)
-
         if episode % 10 == 0:
-            print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
 
     return Q, total_rewards
 
+def algo1_tiled(env, gamma=0.99, stepSize=0.1, maxEpisodes=400, epsilon=0.1, tileCoder=None):
+    #Q-learning with a hashed tile-coded linear Q(s, a) over the acted-on floor's own state instead of the dense table.
+    #Floors share the features, memory is fixed by tileCoder.memorySize and each update only touches the active tiles,
+    #so this scales to buildings with hundreds of floors. Actions are 0 (nothing) to 3, the same update rule as algo1
+    tileCoder = TileCoder() if tileCoder is None else tileCoder
+    num_actions = len(FLOOR_ACTIONS) + 1
+    Q = SparseLinear(tileCoder.memorySize, num_actions)
+    num_floors = env.building.getNumFloors()
+
+    total_rewards = []
+
+    for episode in range(maxEpisodes):
+        env.reset()
+        episode_reward = 0
+        step_count = 0
+
+        while not env.terminated:
+            with PROFILER.phase("select_action"):
+                floor = random.randint(0, num_floors - 1)
+                active = tileCoder.floorTiles(env.building.floors[floor])
+                values = Q.values(active)
+
+                if random.uniform(0, 1) < epsilon:
+                    action_num = random.randint(0, num_actions - 1)
+                else:
+                    action_num = int(np.argmax(values))
+
+            with PROFILER.phase("env_step"):
+                _, reward, terminated = env.step([floor, action_num])
+            episode_reward += reward
 
+            with PROFILER.phase("td_update"):
+                next_values = Q.values(tileCoder.floorTiles(env.building.floors[floor]))
+                td_target = reward + gamma * np.max(next_values)
+                Q.update(active, action_num, stepSize * (td_target - values[action_num]))
+
+            step_count += 1
+            if step_count >= 500: #safeguard against infinite loops
+                break
+
+        total_rewards.append(episode_reward)
+        if episode % 10 == 0:
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+
+    return Q, total_rewards
@@ -1,19 +1,43 @@
 import numpy as np
 import random
-
-def softmax(x):
-    #to convert a vector into probability distribution
-    #first stabilize by subtracting the max value from x to avoid large exponenTS
-    z = x - np.max(x)
-    return np.exp(z) / np.sum(np.exp(z))
-
-def algo2(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, alpha=0.1):
+from profiler import PROFILER
+from tile_coding import TileCoder, SparseLinear
+from policy_cache import PolicyCache, softmax
+
+def replay_update(Q1_flat, Q2_flat, policy, replayBuffer, batchSize, gamma, stepSize, alpha, convergence=None):
+    #soft TD update for both critics over a minibatch of stored transitions at once
+    indices, s, a, r, s_next, dones, weights = replayBuffer.sample(batchSize)
+
+    Q_min_next = np.minimum(Q1_flat[s_next], Q2_flat[s_next])
+    pi_next = policy.probsFlat[s_next]
+    log_pi_next = np.log(pi_next + 1e-10)
+    V_next = np.sum(pi_next * (Q_min_next - alpha * log_pi_next), axis=1)
+    y = r + gamma * V_next * (1 - dones)
+
+    td_error_1 = y - Q1_flat[s, a]
+    td_error_2 = y - Q2_flat[s, a]
+    updates_1 = stepSize * weights * td_error_1
+    updates_2 = stepSize * weights * td_error_2
+    if convergence is not None:
+        greedy_before = np.argmax(np.minimum(Q1_flat[s], Q2_flat[s]), axis=1)
+    np.add.at(Q1_flat, (s, a), updates_1)
+    np.add.at(Q2_flat, (s, a), updates_2)
+    #only the updated states' policy rows are stale
+    policy.refreshRows(s, np.minimum(Q1_flat[s], Q2_flat[s]) / alpha)
+    if convergence is not None:
+        greedy_changes = np.count_nonzero(np.argmax(np.minimum(Q1_flat[s], Q2_flat[s]), axis=1) != greedy_before)
+        convergence.updateBatch(np.maximum(np.abs(updates_1), np.abs(updates_2)), greedy_changes)
+    replayBuffer.updatePriorities(indices, np.maximum(np.abs(td_error_1), np.abs(td_error_2)))
+
+def algo2(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, alpha=0.1, recorder=None, replayBuffer=None, batchSize=32, convergence=None, initialQ=None):
     
     
     # this is a discrete adaptation of Soft Actor-Critic
     #operates on a per-floor basis, choosing to either 1: Switch Lights, 2: Increase Temperature, 3: Decrease Temperature
     #maintains two Q-value estimates (Q1 and Q2) for Soft Actor-Critic
     #uses a policy derived from Q-values via a softmax distribution
+    #pass a ConvergenceMonitor as convergence to stop early once Q1/Q2 stop changing, its stopEpisode says when
+    #initialQ is an optional (Q1, Q2) pair to warm-start from instead of zeros, e.g. from transfer.warmStart
 
   
     num_floors = env.building.getNumFloors()
@@ -23,73 +47,133 @@ def algo2(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, alpha=0.1):
     # each floor considered as a separate subset of states
     Q1 = np.zeros((num_floors, 2, 3, num_actions_per_floor)) 
     Q2 = np.zeros((num_floors, 2, 3, num_actions_per_floor))
+    if initialQ is not None:
+        Q1[:], Q2[:] = initialQ
+    #flat (state index, action) views for the replay minibatch updates
+    Q1_flat = Q1.reshape(-1, num_actions_per_floor)
+    Q2_flat = Q2.reshape(-1, num_actions_per_floor)
+    #softmax policy of every state, refreshed row by row as Q1/Q2 change
+    policy = PolicyCache(np.minimum(Q1, Q2) / alpha)
 
     total_rewards = []
 
-    def get_state_index(state, floor):
-        light_status = 1 if state.floors[floor].lightStatus else 0
-        temp = state.floors[floor].temperature
-        if temp < 20:
-            t = 0
-        elif temp < 23:
-            t = 1
-        else:
-            t = 2
-        return floor, light_status, t
+    obs = env.observation
 
     for episode in range(maxEpisodes):
-        state = env.reset()
+        env.reset()
         episode_reward = 0
         step_count = 0
 
         while not env.terminated:
             
-            floor = random.randint(0, num_floors - 1)
-            f, ls, ts = get_state_index(state, floor)
+            with PROFILER.phase("select_action"):
+                floor = random.randint(0, num_floors - 1)
+                f, ls, ts = obs.floorIndex(floor)
+
+                action_idx = policy.sample((f, ls, ts))
+                action = [floor, action_idx + 1]  # 1,2,3 actions, env.step dispatches them through FLOOR_ACTIONS
 
-            Q_min = np.minimum(Q1[f, ls, ts, :], Q2[f, ls, ts, :])
-            pi = softmax(Q_min / alpha)
 
-            action_idx = np.random.choice(range(num_actions_per_floor), p=pi)
-            action = [floor, action_idx + 1]  # 1,2,3 actions
+            with PROFILER.phase("env_step"):
+                next_state, reward, terminated = env.step(action)
+            episode_reward += reward
+            if recorder is not None:
+                with PROFILER.phase("logging"):
+                    recorder.record(episode, step_count, action, reward, terminated, next_state)
+
+            with PROFILER.phase("td_update"):
+                nf, nls, nts = obs.floorIndex(floor)
+
+                Q_min_next = np.minimum(Q1[nf, nls, nts, :], Q2[nf, nls, nts, :])
+                pi_next = policy.probs[nf, nls, nts]
+
+                log_pi_next = np.log(pi_next + 1e-10)
+                V_next = np.sum(pi_next * (Q_min_next - alpha * log_pi_next))
+                y = reward + (gamma * V_next if not terminated else 0)
+
+                td_error_1 = y - Q1[f, ls, ts, action_idx]
+                td_error_2 = y - Q2[f, ls, ts, action_idx]
+                if convergence is not None:
+                    #the greedy action of the softmax policy is the argmax of the smaller critic
+                    greedy_before = np.argmax(np.minimum(Q1[f, ls, ts], Q2[f, ls, ts]))
+                Q1[f, ls, ts, action_idx] += stepSize * td_error_1
+                Q2[f, ls, ts, action_idx] += stepSize * td_error_2
+                policy.refreshRow((f, ls, ts), np.minimum(Q1[f, ls, ts], Q2[f, ls, ts]) / alpha)
+                if convergence is not None:
+                    greedy_changed = np.argmax(np.minimum(Q1[f, ls, ts], Q2[f, ls, ts])) != greedy_before
+                    convergence.update(stepSize * max(abs(td_error_1), abs(td_error_2)), greedy_changed)
+
+                if replayBuffer is not None:
+                    state_idx = np.ravel_multi_index((f, ls, ts), Q1.shape[:3])
+                    next_state_idx = np.ravel_multi_index((nf, nls, nts), Q1.shape[:3])
+                    replayBuffer.add(state_idx, action_idx, reward, next_state_idx, terminated)
+                    if len(replayBuffer) >= batchSize:
+                        replay_update(Q1_flat, Q2_flat, policy, replayBuffer, batchSize, gamma, stepSize, alpha, convergence)
+
+            step_count += 1
 
+            #stop infinite loops
+            if step_count >= 500:
+                break
 
-            # NOW environment can call `self.building.floors[floorNum].actionFunc()`.
-            chosen_floor = env.building.floors[floor]
-            if action[1] == 1:
-                chosen_floor.actionFunc = chosen_floor.switchLights
-            elif action[1] == 2:
-                chosen_floor.actionFunc = chosen_floor.increaseTemp
-            elif action[1] == 3:
-                chosen_floor.actionFunc = chosen_floor.decreaseTemp
+        total_rewards.append(episode_reward)
+        if episode % 10 == 0:
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
 
+        if convergence is not None and convergence.endEpisode():
+            print(f"Converged, stopping after episode {episode}")
+            break
 
-            next_state, reward, terminated = env.step(action)
-            episode_reward += reward
+    return Q1, Q2, total_rewards
+
+def algo2_tiled(env, gamma=0.99, stepSize=0.1, maxEpisodes=400, alpha=0.1, tileCoder=None):
+    #the soft Q update of algo2 with two hashed tile-coded linear critics in place of the dense Q1/Q2 tables
+    #floors share the features, memory is fixed by tileCoder.memorySize and updates only touch the active tiles
+    tileCoder = TileCoder() if tileCoder is None else tileCoder
+    num_floors = env.building.getNumFloors()
+    num_actions_per_floor = 3
+    Q1 = SparseLinear(tileCoder.memorySize, num_actions_per_floor)
+    Q2 = SparseLinear(tileCoder.memorySize, num_actions_per_floor)
 
-            nf, nls, nts = get_state_index(next_state, floor)
+    total_rewards = []
+
+    for episode in range(maxEpisodes):
+        env.reset()
+        episode_reward = 0
+        step_count = 0
 
-            Q_min_next = np.minimum(Q1[nf, nls, nts, :], Q2[nf, nls, nts, :])
-            pi_next = softmax(Q_min_next / alpha)
+        while not env.terminated:
+            with PROFILER.phase("select_action"):
+                floor = random.randint(0, num_floors - 1)
+                active = tileCoder.floorTiles(env.building.floors[floor])
+                q1 = Q1.values(active)
+                q2 = Q2.values(active)
+                pi = softmax(np.minimum(q1, q2) / alpha)
+                action_idx = np.random.choice(num_actions_per_floor, p=pi)
+
+            with PROFILER.phase("env_step"):
+                _, reward, terminated = env.step([floor, action_idx + 1])
+            episode_reward += reward
 
-            log_pi_next = np.log(pi_next + 1e-10)
-            V_next = np.sum(pi_next * (Q_min_next - alpha * log_pi_next))
-            y = reward + (gamma * V_next if not terminated else 0)
+            with PROFILER.phase("td_update"):
+                next_active = tileCoder.floorTiles(env.building.floors[floor])
+                Q_min_next = np.minimum(Q1.values(next_active), Q2.values(next_active))
+                pi_next = softmax(Q_min_next / alpha)
+                log_pi_next = np.log(pi_next + 1e-10)
+                V_next = np.sum(pi_next * (Q_min_next - alpha * log_pi_next))
+                y = reward + (gamma * V_next if not terminated else 0)
 
-            td_error_1 = y - Q1[f, ls, ts, action_idx]
-            td_error_2 = y - Q2[f, ls, ts, action_idx]
-            Q1[f, ls, ts, action_idx] += stepSize * td_error_1
-            Q2[f, ls, ts, action_idx] += stepSize * td_error_2
+                Q1.update(active, action_idx, stepSize * (y - q1[action_idx]))
+                Q2.update(active, action_idx, stepSize * (y - q2[action_idx]))
 
-            state = next_state
             step_count += 1
-
-            #stop infinite loops
             if step_count >= 500:
                 break
 
         total_rewards.append(episode_reward)
         if episode % 10 == 0:
-            print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
 
     return Q1, Q2, total_rewards
@@ -1,33 +1,28 @@
 import numpy as np
 import random
+from profiler import PROFILER
 import matplotlib.pyplot as plt
+from Environment import FLOOR_ACTIONS
+from tile_coding import TileCoder, SparseLinear
+from policy_cache import PolicyCache, softmax
 
-def softmax(x):
-    z = x - np.max(x)
-    return np.exp(z) / np.sum(np.exp(z))
-
-def algo3(env, gamma=0.99, stepSize=0.01, maxEpisodes=400):
+def algo3(env, gamma=0.99, stepSize=0.01, maxEpisodes=400, recorder=None, convergence=None, initialTheta=None):
+    # Pass a ConvergenceMonitor as convergence to stop early once theta stops changing, its stopEpisode says when.
+    # initialTheta warm-starts the policy instead of random preferences, e.g. from transfer.warmStart
     num_floors = env.building.getNumFloors()
     num_actions = env.numActions
     
     # Initialize policy parameters
-    theta = np.random.rand(num_floors, 2, 3, num_actions)
+    theta = np.random.rand(num_floors, 2, 3, num_actions) if initialTheta is None else np.array(initialTheta, dtype=np.float64)
+    # theta only changes between episodes, so the softmax of every state is computed once per episode
+    policy = PolicyCache(theta)
     
     total_rewards = []
 
-    def get_state_index(state, floor):
-        light_status = 1 if state.floors[floor].lightStatus else 0
-        temp = state.floors[floor].temperature
-        if temp < 20:
-            t = 0
-        elif temp < 23:
-            t = 1
-        else:
-            t = 2
-        return floor, light_status, t
+    obs = env.observation
 
     for episode in range(maxEpisodes):
-        state = env.reset()
+        env.reset()
         episode_reward = 0
         step_count = 0
         
@@ -37,23 +32,26 @@ def algo3(env, gamma=0.99, stepSize=0.01, maxEpisodes=400):
         episode_rewards = []
 
         while not env.terminated:
-            floor = random.randint(0, num_floors - 1)
-            f, ls, ts = get_state_index(state, floor)
+            with PROFILER.phase("select_action"):
+                floor = random.randint(0, num_floors - 1)
+                f, ls, ts = obs.floorIndex(floor)
             
-            # Compute policy (softmax over theta)
-            pi = softmax(theta[f, ls, ts, :])
-            action_idx = np.random.choice(range(num_actions), p=pi)
-            action = [floor, action_idx]
+                # Sample from the cached policy (softmax over theta)
+                action_idx = policy.sample((f, ls, ts))
+                action = [floor, action_idx]
             
-            next_state, reward, terminated = env.step(action)
+            with PROFILER.phase("env_step"):
+                next_state, reward, terminated = env.step(action)
             episode_reward += reward
+            if recorder is not None:
+                with PROFILER.phase("logging"):
+                    recorder.record(episode, step_count, action, reward, terminated, next_state)
 
             # Store the state, action, and reward
             episode_states.append((f, ls, ts))
             episode_actions.append(action_idx)
             episode_rewards.append(reward)
 
-            state = next_state
             step_count += 1
 
             if step_count >= 500:  # safeguard against infinite loops
@@ -61,28 +59,107 @@ def algo3(env, gamma=0.99, stepSize=0.01, maxEpisodes=400):
 
         total_rewards.append(episode_reward)
 
-        # Compute returns and update policy parameters
-        G = 0
-        returns = []
-        for r in reversed(episode_rewards):
-            G = r + gamma * G
-            returns.insert(0, G)
+        with PROFILER.phase("policy_update"):
+            # Compute returns and update policy parameters
+            G = 0
+            returns = []
+            for r in reversed(episode_rewards):
+                G = r + gamma * G
+                returns.insert(0, G)
         
-        returns = np.array(returns)
-        returns = (returns - np.mean(returns)) / (np.std(returns) + 1e-10)  # Normalize returns
-
-        for (f, ls, ts), action_idx, G in zip(episode_states, episode_actions, returns):
-            pi = softmax(theta[f, ls, ts, :])
-            grad_log_pi = -pi
-            grad_log_pi[action_idx] += 1
-            theta[f, ls, ts, :] += stepSize * grad_log_pi * G
+            returns = np.array(returns)
+            returns = (returns - np.mean(returns)) / (np.std(returns) + 1e-10)  # Normalize returns
+
+            # All transitions at once, with the gradient of the policy the episode was played with
+            states = tuple(np.array(episode_states, dtype=np.intp).T)
+            actions = np.array(episode_actions)
+            grad_log_pi = -policy.probs[states]
+            grad_log_pi[np.arange(len(actions)), actions] += 1
+            updates = stepSize * grad_log_pi * returns[:, None]
+            if convergence is not None:
+                greedy_before = np.argmax(theta[states], axis=1)
+            # np.add.at accumulates states visited more than once
+            np.add.at(theta, states, updates)
+            if convergence is not None:
+                # Whole rows move, each row's largest entry change stands for its update
+                greedy_changes = np.count_nonzero(np.argmax(theta[states], axis=1) != greedy_before)
+                convergence.updateBatch(np.max(np.abs(updates), axis=1), greedy_changes)
+            policy.refresh(theta)
 
         if episode % 10 == 0:
-            print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+
+        if convergence is not None and convergence.endEpisode():
+            print(f"Converged, stopping after episode {episode}")
+            break
 
     return theta, total_rewards
 
 
+def algo3_tiled(env, gamma=0.99, stepSize=0.1, maxEpisodes=400, tileCoder=None):
+    # REINFORCE with softmax preferences that are linear in hashed tile features of the acted-on floor, in place of theta.
+    # Floors share the features and memory is fixed by tileCoder.memorySize. Actions are 0 (nothing) to 3
+    tileCoder = TileCoder() if tileCoder is None else tileCoder
+    num_floors = env.building.getNumFloors()
+    num_actions = len(FLOOR_ACTIONS) + 1
+    # Zero preferences start from the uniform policy
+    theta = SparseLinear(tileCoder.memorySize, num_actions)
+
+    total_rewards = []
+
+    for episode in range(maxEpisodes):
+        env.reset()
+        episode_reward = 0
+        step_count = 0
+
+        episode_features = []
+        episode_actions = []
+        episode_rewards = []
+
+        while not env.terminated:
+            with PROFILER.phase("select_action"):
+                floor = random.randint(0, num_floors - 1)
+                active = tileCoder.floorTiles(env.building.floors[floor])
+                pi = softmax(theta.values(active))
+                action_idx = np.random.choice(num_actions, p=pi)
+
+            with PROFILER.phase("env_step"):
+                _, reward, terminated = env.step([floor, action_idx])
+            episode_reward += reward
+
+            episode_features.append(active)
+            episode_actions.append(action_idx)
+            episode_rewards.append(reward)
+
+            step_count += 1
+            if step_count >= 500:  # safeguard against infinite loops
+                break
+
+        total_rewards.append(episode_reward)
+
+        with PROFILER.phase("policy_update"):
+            G = 0
+            returns = []
+            for r in reversed(episode_rewards):
+                G = r + gamma * G
+                returns.insert(0, G)
+
+            returns = np.array(returns)
+            returns = (returns - np.mean(returns)) / (np.std(returns) + 1e-10)  # Normalize returns
+
+            for active, action_idx, G in zip(episode_features, episode_actions, returns):
+                pi = softmax(theta.values(active))
+                grad_log_pi = -pi
+                grad_log_pi[action_idx] += 1
+                theta.updateRow(active, stepSize * grad_log_pi * G)
+
+        if episode % 10 == 0:
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Total Reward: {episode_reward:.2f}, Steps: {step_count}")
+
+    return theta, total_rewards
+
 
 def plot_rewards(rewards, title="REINFORCE Performance"):
     plt.figure(figsize=(10, 6))
@@ -2,7 +2,11 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.multiprocessing as mp
+import queue
 from copy import deepcopy
+from profiler import PROFILER
+from Environment import Environment
 
 
 GAMMA = 0.99
@@ -13,6 +17,13 @@ ENTROPY_COEF = 0.01
 BATCH_SIZE = 64
 MAX_EPISODES = 500
 MAX_STEPS_PER_EPISODE = 500
+#number of steps collected per update, rollouts span episode boundaries
+ROLLOUT_HORIZON = 1024
+#stop the update epochs early once the approximate KL from the rollout policy passes 1.5x this, None disables
+TARGET_KL = 0.02
+#V-trace truncation levels for the importance weights of stale actor rollouts
+RHO_BAR = 1.0
+C_BAR = 1.0
 
 #neural network approximations
 class ActorCritic(nn.Module):
@@ -56,46 +67,76 @@ class PPOAgent:
         self.policy = ActorCritic(state_dim, action_dim)
         self.optimizer = optim.Adam(self.policy.parameters(), lr=LR)
 
-    def update(self, memory):
+    def update(self, memory, vtrace=False):
+        #vtrace=True is used for rollouts collected by actors with an older copy of the policy, memory.logprobs then come from that behaviour policy
         states = torch.tensor(np.array(memory.states), dtype=torch.float)
         actions = torch.tensor(memory.actions, dtype=torch.long).view(-1,1)
         rewards = torch.tensor(memory.rewards, dtype=torch.float).view(-1,1)
         dones = torch.tensor(memory.dones, dtype=torch.float).view(-1,1)
+        ends = torch.tensor(memory.ends, dtype=torch.float).view(-1,1)
+        bootstrap_values = torch.tensor(memory.bootstrap_values, dtype=torch.float).view(-1,1)
         old_logprobs = torch.tensor(memory.logprobs, dtype=torch.float).view(-1,1)
 
 
         with torch.no_grad():
-            _, values = self.policy.get_action_probs(states)
+            action_probs, values = self.policy.get_action_probs(states)
             values = values.view(-1,1)
+            #value of the following state: the next stored step, or the stored bootstrap value where an episode or the rollout was cut
             next_values = torch.cat([values[1:], torch.zeros(1,1)], dim=0)
-            deltas = rewards + GAMMA * next_values * (1 - dones) - values
-            advantages = torch.zeros_like(rewards)
-            running_adv = 0
-            for t in reversed(range(len(rewards))):
-                running_adv = running_adv * GAMMA * (1 - dones[t]) + deltas[t]
-                advantages[t] = running_adv
-            returns = advantages + values
-
-        #normalize advantages
-        advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
-
-        #update
+            next_values = torch.where(ends.bool(), bootstrap_values, next_values)
+            if vtrace:
+                current_logprobs = torch.distributions.Categorical(action_probs).log_prob(actions.squeeze(-1)).view(-1,1)
+                advantages, returns = vtrace_targets(rewards, values, next_values, dones, ends, current_logprobs - old_logprobs)
+            else:
+                deltas = rewards + GAMMA * next_values * (1 - dones) - values
+                advantages = torch.zeros_like(rewards)
+                running_adv = 0
+                for t in reversed(range(len(rewards))):
+                    running_adv = running_adv * GAMMA * (1 - ends[t]) + deltas[t]
+                    advantages[t] = running_adv
+                returns = advantages + values
+
+        #normalize advantages, the std of a single sample is NaN so one-step batches (e.g. a short leftover rollout) are used as they are
+        if len(advantages) > 1:
+            advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+        actions = actions.squeeze(-1)
+        old_logprobs = old_logprobs.squeeze(-1)
+        advantages = advantages.squeeze(-1)
+
+        #update, K_EPOCHS passes of shuffled minibatches
+        num_samples = len(rewards)
         for _ in range(K_EPOCHS):
-            action_probs, value = self.policy.get_action_probs(states)
-            dist = torch.distributions.Categorical(action_probs)
-            current_logprobs = dist.log_prob(actions.squeeze())
-
-            ratio = (current_logprobs - old_logprobs.squeeze()).exp()
-            surr1 = ratio * advantages.squeeze()
-            surr2 = torch.clamp(ratio, 1 - EPS_CLIP, 1 + EPS_CLIP) * advantages.squeeze()
-
-            entropy = dist.entropy().mean()
-            loss = -torch.min(surr1, surr2).mean() + 0.5 * ((returns - value)**2).mean() - ENTROPY_COEF * entropy
+            epoch_kl = 0
+            for batch in torch.randperm(num_samples).split(BATCH_SIZE):
+                action_probs, value = self.policy.get_action_probs(states[batch])
+                dist = torch.distributions.Categorical(action_probs)
+                current_logprobs = dist.log_prob(actions[batch])
+
+                log_ratio = current_logprobs - old_logprobs[batch]
+                ratio = log_ratio.exp()
+                surr1 = ratio * advantages[batch]
+                surr2 = torch.clamp(ratio, 1 - EPS_CLIP, 1 + EPS_CLIP) * advantages[batch]
+
+                entropy = dist.entropy().mean()
+                loss = -torch.min(surr1, surr2).mean() + 0.5 * ((returns[batch] - value)**2).mean() - ENTROPY_COEF * entropy
+
+                self.optimizer.zero_grad()
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(self.policy.parameters(), 0.5)
+                self.optimizer.step()
+
+                #low variance KL estimate (ratio - 1 - log ratio), weighted by minibatch size
+                with torch.no_grad():
+                    epoch_kl += ((ratio - 1) - log_ratio).sum().item()
+
+            if TARGET_KL is not None and epoch_kl / num_samples > 1.5 * TARGET_KL:
+                break
 
-            self.optimizer.zero_grad()
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(self.policy.parameters(), 0.5)
-            self.optimizer.step()
+    def value(self, state):
+        #critic estimate for a single state, used to bootstrap where a rollout is cut before a terminal state
+        with torch.no_grad():
+            _, value = self.policy(torch.tensor(state, dtype=torch.float).unsqueeze(0))
+        return value.item()
 
     def act(self, state):
         state_t = torch.tensor(state, dtype=torch.float).unsqueeze(0)
@@ -103,6 +144,28 @@ class PPOAgent:
         return action, logprob.item(), value.item()
 
 
+def vtrace_targets(rewards, values, next_values, dones, ends, log_rhos):
+    #V-trace (Espeholt et al. 2018): off-policy corrected value targets from truncated importance weights, and advantages bootstrapped from them
+    rhos = log_rhos.exp()
+    clipped_rhos = torch.clamp(rhos, max=RHO_BAR)
+    cs = torch.clamp(rhos, max=C_BAR)
+    deltas = clipped_rhos * (rewards + GAMMA * next_values * (1 - dones) - values)
+
+    vs_minus_v = torch.zeros_like(values)
+    running = 0
+    for t in reversed(range(len(rewards))):
+        running = deltas[t] + GAMMA * (1 - ends[t]) * cs[t] * running
+        vs_minus_v[t] = running
+    vs = values + vs_minus_v
+
+    #past an episode or rollout cut the bootstrap value stands in for the next v_s
+    next_vs = torch.where(ends.bool(), next_values, torch.cat([vs[1:], torch.zeros(1,1)], dim=0))
+    #the policy advantages are left uncorrected: the clipped PPO surrogate already weights them by pi/mu against the behaviour
+    #log-probs, multiplying by clipped_rhos here too would apply the importance correction twice
+    advantages = rewards + GAMMA * next_vs * (1 - dones) - values
+    return advantages, vs
+
+
 #,memory for PPO
 class Memory:
     def __init__(self):
@@ -111,13 +174,23 @@ class Memory:
         self.rewards = []
         self.logprobs = []
         self.dones = []
+        #ends marks the last step before an episode or rollout cut, bootstrap_values holds V(next state) at truncation cuts
+        self.ends = []
+        self.bootstrap_values = []
 
     def store(self, state, action, reward, logprob, done):
+        #done means the goal was reached (a true terminal state), step-limit truncation is recorded with mark_end instead
         self.states.append(state)
         self.actions.append(action)
         self.rewards.append(reward)
         self.logprobs.append(logprob)
         self.dones.append(done)
+        self.ends.append(done)
+        self.bootstrap_values.append(0.0)
+
+    def mark_end(self, bootstrap_value=0.0):
+        self.ends[-1] = True
+        self.bootstrap_values[-1] = bootstrap_value
 
     def clear(self):
         self.states = []
@@ -125,93 +198,199 @@ class Memory:
         self.rewards = []
         self.logprobs = []
         self.dones = []
+        self.ends = []
+        self.bootstrap_values = []
 
+    def __len__(self):
+        return len(self.rewards)
 
 
 
 
 
 
-# Helper functions to convert environment state to numeric vector
-def state_to_vector(building):
-    floors_data = []
-    for floor in building.floors:
-        floors_data.append(1.0 if floor.lightStatus else 0.0)
-        floors_data.append(float(floor.temperature))
-        floors_data.append(float(floor.numOccupants))
-
-    state_vec = [building.outsideTemperature] + floors_data + [building.totalEnergyUsed, building.averageComfort]
-    state_vec = np.array(state_vec, dtype=float)
-
-    #normalization
-    mean = np.mean(state_vec)
-    std = np.std(state_vec) + 1e-8
-    state_vec = (state_vec - mean) / std
-    return state_vec
-
-
 
 # training loop function
-def algo3(env):
+def algo3(env, recorder=None, maxEpisodes=MAX_EPISODES):
     #state dimension and action dimension
     num_floors = env.building.getNumFloors()
     action_dim = num_floors * 3
 
-    #initial state dimension
-    initial_state = env.reset()
-    state_vec = state_to_vector(initial_state)
-    state_dim = len(state_vec)
+    #initial state dimension, the observation encoder keeps the dense state vector up to date as the env steps
+    env.reset()
+    obs = env.observation
+    state_dim = obs.vectorSize
 
     agent = PPOAgent(state_dim, action_dim)
     memory = Memory()
 
     total_rewards = []
 
-    for episode in range(MAX_EPISODES):
-        building = env.reset()
-        state = state_to_vector(building)
-        memory.clear()
+    for episode in range(maxEpisodes):
+        env.reset()
+        #copy since the encoder overwrites its buffer on every step
+        state = obs.vector().copy()
         episode_reward = 0
 
         for step in range(MAX_STEPS_PER_EPISODE):
-            action, logprob, _ = agent.act(state)
-            floor_idx = action // 3
-            sub_action = action % 3
-            step_count = 0
-
-            chosen_floor = env.building.floors[floor_idx]
-            if sub_action == 0:
-                chosen_floor.actionFunc = chosen_floor.switchLights
-            elif sub_action == 1:
-                chosen_floor.actionFunc = chosen_floor.increaseTemp
-            elif sub_action == 2:
-                chosen_floor.actionFunc = chosen_floor.decreaseTemp
-
-            # env expects action as [floorNum, actionNum starting at 1]
-            # sub_action:0->1(switch),1->2(inc),2->3(dec)
-            act = [floor_idx, sub_action + 1]
-            next_building, reward, done = env.step(act)
-            next_state = state_to_vector(next_building)
-
-            memory.store(state, action, reward, logprob, done)
+            with PROFILER.phase("select_action"):
+                action, logprob, _ = agent.act(state)
+
+            # env expects action as [floorNum, actionNum starting at 1], precomputed for every flat action
+            act = env.flatActions[action]
+            with PROFILER.phase("env_step"):
+                next_building, reward, done = env.step(act)
+                next_state = obs.vector().copy()
+            if recorder is not None:
+                with PROFILER.phase("logging"):
+                    recorder.record(episode, step, act, reward, done, next_building)
+
+            #reaching the goal is terminal, hitting the environment's step limit is only a truncation
+            terminal = done and not env.truncated
+            memory.store(state, action, reward, logprob, terminal)
             state = next_state
             episode_reward += reward
-            step_count += 1  
 
             if done:
                 break
-            
-            if step_count >= 500: #stop infinite loops
-                break
-          
 
-
-        if len(memory.rewards) < 2:
-            continue
-
-        agent.update(memory)
+            #the rollout horizon is independent of episodes, cut here and bootstrap from the state the next rollout continues from
+            if len(memory) >= ROLLOUT_HORIZON and step < MAX_STEPS_PER_EPISODE - 1:
+                memory.mark_end(agent.value(state))
+                with PROFILER.phase("ppo_update"):
+                    agent.update(memory)
+                memory.clear()
+
+        #episode truncated by a step limit, bootstrap instead of treating the last state as terminal
+        if not terminal:
+            memory.mark_end(agent.value(state))
+
+        if len(memory) >= ROLLOUT_HORIZON:
+            with PROFILER.phase("ppo_update"):
+                agent.update(memory)
+            memory.clear()
         total_rewards.append(episode_reward)
         if episode % 10 == 0:
-            print(f"Episode {episode}, Reward: {episode_reward}")
+            with PROFILER.phase("logging"):
+                print(f"Episode {episode}, Reward: {episode_reward}")
+
+    #learn from whatever is left of the last rollout
+    if len(memory) > 0:
+        agent.update(memory)
 
     return total_rewards
+
+
+# actor process for the decoupled actor-learner mode, keeps generating episodes with the most recently published weights
+def actor_process(actor_id, env_config, shared_policy, weights_version, weights_lock, rollout_queue, stop_event, seed):
+    torch.set_num_threads(1)
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    #a fresh copy of the caller's env, see Environment.config
+    env = Environment(**env_config)
+    obs = env.observation
+    num_floors = env.building.getNumFloors()
+    policy = ActorCritic(obs.vectorSize, num_floors * 3)
+    version = -1
+
+    while not stop_event.is_set():
+        #pick up new weights between episodes, the lock keeps the learner from publishing halfway through the copy
+        if weights_version.value != version:
+            with weights_lock:
+                policy.load_state_dict(shared_policy.state_dict())
+                version = weights_version.value
+
+        env.reset()
+        state = obs.vector().copy()
+        memory = Memory()
+        episode_reward = 0
+        with torch.no_grad():
+            for step in range(MAX_STEPS_PER_EPISODE):
+                action, logprob, _ = policy.get_action(torch.tensor(state, dtype=torch.float).unsqueeze(0))
+                _, reward, done = env.step(env.flatActions[action])
+                terminal = done and not env.truncated
+                memory.store(state, action, reward, logprob.item(), terminal)
+                state = obs.vector().copy()
+                episode_reward += reward
+                if done:
+                    break
+            #truncated episodes bootstrap from the value of the state they stopped in
+            if not terminal:
+                _, value = policy(torch.tensor(state, dtype=torch.float).unsqueeze(0))
+                memory.mark_end(value.item())
+
+        rollout = (actor_id, version, memory, episode_reward)
+        #bounded queue, actors wait here while the learner is behind
+        while not stop_event.is_set():
+            try:
+                rollout_queue.put(rollout, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+def get_rollout(rollout_queue, actors, timeout=1.0):
+    #actors only stop once stop_event is set, so one that exited before that crashed and the learner raises instead of waiting forever
+    while True:
+        try:
+            return rollout_queue.get(timeout=timeout)
+        except queue.Empty:
+            for process in actors:
+                if not process.is_alive():
+                    raise RuntimeError(f"Actor process {process.pid} died with exit code {process.exitcode}")
+
+
+def algo4_actor_learner(env, numActors=2, maxEpisodes=MAX_EPISODES, publishInterval=1, queueSize=4, seed=0):
+    #decoupled PPO: actor processes step their own environments while this process only learns.
+    #rollouts may come from weights a few updates old, so the update uses V-trace targets and clips the ratio against the behaviour policy
+    num_floors = env.building.getNumFloors()
+    action_dim = num_floors * 3
+    state_dim = env.observation.vectorSize
+
+    agent = PPOAgent(state_dim, action_dim)
+    shared_policy = ActorCritic(state_dim, action_dim)
+    shared_policy.load_state_dict(agent.policy.state_dict())
+    shared_policy.share_memory()
+    weights_version = mp.Value('i', 0)
+    weights_lock = mp.Lock()
+    rollout_queue = mp.Queue(maxsize=queueSize)
+    stop_event = mp.Event()
+
+    actors = []
+    for actor_id in range(numActors):
+        process = mp.Process(target=actor_process, args=(actor_id, env.config(), shared_policy, weights_version, weights_lock,
+                                                         rollout_queue, stop_event, seed + actor_id), daemon=True)
+        process.start()
+        actors.append(process)
+
+    total_rewards = []
+    updates = 0
+    try:
+        for episode in range(maxEpisodes):
+            actor_id, version, memory, episode_reward = get_rollout(rollout_queue, actors)
+            total_rewards.append(episode_reward)
+            if len(memory) > 0:
+                with PROFILER.phase("ppo_update"):
+                    agent.update(memory, vtrace=True)
+                updates += 1
+                #broadcast the new weights to the actors
+                if updates % publishInterval == 0:
+                    with weights_lock:
+                        with torch.no_grad():
+                            for shared_param, param in zip(shared_policy.parameters(), agent.policy.parameters()):
+                                shared_param.copy_(param)
+                        weights_version.value += 1
+            if episode % 10 == 0:
+                print(f"Episode {episode}, Actor {actor_id}, Weights version {version}, Reward: {episode_reward}")
+    finally:
+        stop_event.set()
+        #drain the queue so actors blocked on put can exit
+        while any(process.is_alive() for process in actors):
+            try:
+                rollout_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for process in actors:
+            process.join()
+
+    return total_rewards, agent
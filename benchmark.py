@@ -0,0 +1,168 @@
+import argparse
+import contextlib
+import functools
+import importlib
+import io
+import json
+import multiprocessing as mp
+import random
+import resource
+import sys
+import time
+import numpy as np
+from Environment import Environment
+from evaluation import scenarioBuilding
+
+# (module, function, hyperparameters) for every benchmarked algorithm, algo4's PPO loop is also called algo3
+BENCHMARKS = {
+    "algo1": ("algo1", "algo1", {"gamma": 0.95, "stepSize": 0.1, "epsilon": 0.2}),
+    "algo1_factored": ("algo1", "algo1_factored", {"gamma": 0.95, "stepSize": 0.1, "epsilon": 0.2}),
+    "algo2": ("algo2", "algo2", {"gamma": 0.95, "stepSize": 0.1, "alpha": 0.2}),
+    "algo3": ("algo3", "algo3", {"gamma": 0.95, "stepSize": 0.1}),
+    "algo4": ("algo4", "algo3", {}),
+}
+# Metrics where a higher value is better, for every other compared metric lower is better
+HIGHER_IS_BETTER = ("episodesPerSec", "stepsPerSec")
+COMPARED_METRICS = ("episodesPerSec", "stepsPerSec", "peakRssMB", "timeToThreshold", "stepsToThreshold")
+
+
+class TimedEnvironment(Environment):
+    # Records the wall-clock time and step count at the end of every episode without changing the algorithms.
+    # An episode ends when the next one resets the environment, or when training returns for the last one
+    def __init__(self, *args, **kwargs):
+        self.episodeEnds = []
+        self.episodeSteps = []
+        super().__init__(*args, **kwargs)
+
+    def endEpisode(self):
+        if self.numStepsTaken > 0:
+            self.episodeEnds.append(time.perf_counter())
+            self.episodeSteps.append(self.numStepsTaken)
+
+    def reset(self):
+        self.endEpisode()
+        return super().reset()
+
+
+def _episodeRewards(result):
+    # Every algo returns its per-episode rewards last, algo4's PPO loop returns nothing else
+    return result[-1] if isinstance(result, tuple) else result
+
+
+def runBenchmark(name, numEpisodes, seed, threshold, window):
+    """
+    Trains one algorithm on the seeded scenario building and measures it. Meant to run in its own process so that
+    peak RSS belongs to this algorithm only.
+    """
+    moduleName, functionName, params = BENCHMARKS[name]
+    algo = getattr(importlib.import_module(moduleName), functionName)
+    random.seed(seed)
+    np.random.seed(seed)
+    if moduleName == "algo4":
+        import torch
+        torch.manual_seed(seed)
+    params = dict(params, maxEpisodes=numEpisodes)
+
+    # The algos print progress every 10 episodes
+    with contextlib.redirect_stdout(io.StringIO()):
+        env = TimedEnvironment(scenarioBuilding(seed), buildingFactory=functools.partial(scenarioBuilding, seed))
+        start = time.perf_counter()
+        rewards = _episodeRewards(algo(env, **params))
+        env.endEpisode()
+        wallClock = time.perf_counter() - start
+
+    rewards = np.asarray(rewards, dtype=np.float64)
+    steps = np.cumsum(env.episodeSteps)
+    elapsed = np.asarray(env.episodeEnds) - start
+    # First episode at which the moving average reward over the last `window` episodes reaches the threshold
+    movingAverage = np.convolve(rewards, np.ones(window) / window, mode="valid")
+    reached = np.flatnonzero(movingAverage >= threshold)
+    episode = int(reached[0]) + window - 1 if len(reached) else None
+
+    return {
+        "episodes": len(rewards),
+        "steps": int(steps[-1]) if len(steps) else 0,
+        "wallClock": wallClock,
+        "episodesPerSec": len(rewards) / wallClock,
+        "stepsPerSec": (int(steps[-1]) if len(steps) else 0) / wallClock,
+        # ru_maxrss is in kilobytes on Linux
+        "peakRssMB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "episodesToThreshold": episode,
+        "timeToThreshold": float(elapsed[episode]) if episode is not None else None,
+        "stepsToThreshold": int(steps[episode]) if episode is not None else None,
+        "finalReward": float(rewards[-window:].mean()) if len(rewards) else None,
+    }
+
+
+def runSuite(algos=tuple(BENCHMARKS), numEpisodes=100, seed=0, threshold=100.0, window=10):
+    """
+    Benchmarks each algorithm in a fresh spawned process, one after another so they don't compete for CPU.
+    Returns the JSON-serializable report.
+    """
+    context = mp.get_context("spawn")
+    results = {}
+    for name in algos:
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(runBenchmark, (name, numEpisodes, seed, threshold, window))
+    config = {"numEpisodes": numEpisodes, "seed": seed, "threshold": threshold, "window": window}
+    return {"config": config, "results": results}
+
+
+def compareReports(report, baseline, tolerance=0.1):
+    """
+    Lists the metrics that regressed by more than `tolerance` (relative) against the baseline report, plus thresholds
+    the baseline reached and this run didn't. Algorithms missing from either report are skipped.
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            current, previous = result.get(metric), base.get(metric)
+            if previous is None:
+                continue
+            if current is None:
+                regressions.append(f"{name}: {metric} was {previous:.4g}, threshold no longer reached")
+                continue
+            if metric in HIGHER_IS_BETTER:
+                regressed = current < previous * (1 - tolerance)
+            else:
+                regressed = current > previous * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{name}: {metric} {previous:.4g} -> {current:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training benchmark for algo1-algo4 on a seeded scenario building")
+    parser.add_argument("--algos", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=100.0, help="Moving average episode reward counted as reaching the target")
+    parser.add_argument("--window", type=int, default=10, help="Episodes in the moving average")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="Earlier report to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown before a metric counts as regressed")
+    args = parser.parse_args()
+
+    report = runSuite(args.algos, args.episodes, args.seed, args.threshold, args.window)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report["results"].items():
+        reached = f"{result['timeToThreshold']:.2f}s / {result['stepsToThreshold']} steps" if result["timeToThreshold"] is not None else "not reached"
+        print(f"{name}: {result['episodesPerSec']:.1f} episodes/s, {result['stepsPerSec']:.0f} steps/s, "
+              f"peak RSS {result['peakRssMB']:.0f} MB, target reward {reached}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compareReports(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
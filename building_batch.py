@@ -0,0 +1,158 @@
+import numpy as np
+from reward_spec import DEFAULT_REWARD
+
+# Per-floor arrays, shape (numBuildings, maxFloors). Buildings with fewer floors are padded with empty, unlit floors
+FLOOR_ARRAYS = {
+    "lightStatus": np.bool_,
+    "temperature": np.float64,
+    "numOccupants": np.int64,
+    "comfort": np.float64,
+    "energyUsed": np.float64,
+    "floorMask": np.bool_,
+}
+# Per-building arrays, shape (numBuildings,)
+BUILDING_ARRAYS = {
+    "numFloors": np.int64,
+    "outsideTemperature": np.float64,
+    "expectedEnergyUsage": np.float64,
+    "totalEnergyUsed": np.float64,
+    "totalComfort": np.float64,
+    "floorsWithOccupants": np.int64,
+    "averageComfort": np.float64,
+    "numStepsTaken": np.int64,
+    "terminated": np.bool_,
+}
+
+
+def floorComfort(lightStatus, temperature, numOccupants):
+    """
+    Vectorized Floor.calculateComfort, same thresholds in the same order.
+    """
+    comfort = lightStatus.astype(np.float64)
+    comfortable = (temperature == 21) | (temperature == 22)
+    mild = ~comfortable & ((temperature - 2 <= 19) | (temperature + 2 >= 24))
+    severe = ~comfortable & ~mild & ((temperature - 4 <= 17) | (temperature + 4 >= 26))
+    comfort = np.where(comfortable, comfort + 1, comfort)
+    comfort = np.where(mild & (comfort >= 1), comfort - 1, comfort)
+    comfort = np.where(severe, np.where(comfort == 2, comfort - 2, 0), comfort)
+    return np.where(numOccupants == 0, -1.0, comfort)
+
+
+def floorEnergy(lightStatus, temperature, outsideTemperature):
+    """
+    Vectorized Floor.calculateEnergyUsage.
+    """
+    return np.where(lightStatus, 0.5, 0.0) + np.abs(outsideTemperature - temperature) * 0.1
+
+
+def allocateArrays(numBuildings, maxFloors):
+    arrays = {name: np.zeros((numBuildings, maxFloors), dtype=dtype) for name, dtype in FLOOR_ARRAYS.items()}
+    arrays.update({name: np.zeros(numBuildings, dtype=dtype) for name, dtype in BUILDING_ARRAYS.items()})
+    return arrays
+
+
+def arrayShapes(numBuildings, maxFloors):
+    # (name, shape, dtype) for every array, used to lay the arrays out in externally owned memory such as shared memory
+    shapes = [(name, (numBuildings, maxFloors), dtype) for name, dtype in FLOOR_ARRAYS.items()]
+    shapes += [(name, (numBuildings,), dtype) for name, dtype in BUILDING_ARRAYS.items()]
+    return shapes
+
+
+class BuildingBatch:
+    def __init__(self, arrays):
+        """
+        Many independent buildings stored as numpy arrays and stepped together. Step semantics match Environment.step,
+        one [floorNum, actionNum] per building, with the aggregates updated from the acted-on floor only.
+
+        Args:
+            arrays (dict): Arrays named as in FLOOR_ARRAYS and BUILDING_ARRAYS, e.g. from allocateArrays or views into shared memory.
+        """
+        self.arrays = arrays
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.numBuildings = len(self.numFloors)
+        self.rows = np.arange(self.numBuildings)
+
+    def loadBuildings(self, buildings):
+        # Copies Building objects into the arrays, only done once when the batch is built
+        self.floorMask[:] = False
+        self.lightStatus[:] = False
+        self.numOccupants[:] = 0
+        for b, building in enumerate(buildings):
+            numFloors = building.getNumFloors()
+            self.numFloors[b] = numFloors
+            self.outsideTemperature[b] = building.outsideTemperature
+            self.floorMask[b, :numFloors] = True
+            for i, floor in enumerate(building.floors):
+                self.lightStatus[b, i] = floor.lightStatus
+                self.temperature[b, i] = floor.temperature
+                self.numOccupants[b, i] = floor.numOccupants
+        self.recompute()
+
+    def recompute(self, rows=None):
+        """
+        Full recalculation of floor comfort/energy and building aggregates, for the given building rows or all of them.
+        Needed after outside temperatures or occupancy are changed directly in the arrays.
+        """
+        rows = self.rows if rows is None else rows
+        mask = self.floorMask[rows]
+        outside = self.outsideTemperature[rows]
+        comfort = np.where(mask, floorComfort(self.lightStatus[rows], self.temperature[rows], self.numOccupants[rows]), -1.0)
+        energy = np.where(mask, floorEnergy(self.lightStatus[rows], self.temperature[rows], outside[:, None]), 0.0)
+        self.comfort[rows] = comfort
+        self.energyUsed[rows] = energy
+
+        numFloors = self.numFloors[rows]
+        self.expectedEnergyUsage[rows] = numFloors * 0.5 + numFloors * (np.abs(outside - 21) * 0.1)
+        self.totalEnergyUsed[rows] = energy.sum(axis=1)
+        counted = comfort != -1
+        self.totalComfort[rows] = np.where(counted, comfort, 0).sum(axis=1)
+        self.floorsWithOccupants[rows] = counted.sum(axis=1)
+        self._updateAverageComfort(rows)
+
+    def _updateAverageComfort(self, rows):
+        occupied = self.floorsWithOccupants[rows]
+        self.averageComfort[rows] = np.where(occupied > 0, self.totalComfort[rows] / np.maximum(occupied, 1), 0)
+
+    def reset(self, rows=None):
+        rows = self.rows if rows is None else rows
+        self.numStepsTaken[rows] = 0
+        self.terminated[rows] = False
+
+    def step(self, floorNums, actionNums, rewardFn=DEFAULT_REWARD):
+        """
+        Applies one [floorNum, actionNum] per building. Returns (rewards, terminated) arrays, rewards are 0 for buildings that terminated.
+        rewardFn is a RewardSpec or any callable over the same before/after aggregate arrays.
+        """
+        floorNums = np.asarray(floorNums)
+        actionNums = np.asarray(actionNums)
+        self.numStepsTaken += 1
+        prevComfort = self.averageComfort.copy()
+        prevEnergy = self.totalEnergyUsed.copy()
+
+        # Only switch/increase/decrease on a real floor change anything, everything else is a no-op like in Environment.step
+        acted = (actionNums >= 1) & (actionNums <= 3) & self.floorMask[self.rows, floorNums]
+        r = self.rows[acted]
+        f = floorNums[acted]
+        a = actionNums[acted]
+
+        oldComfort = self.comfort[r, f]
+        oldEnergy = self.energyUsed[r, f]
+        self.lightStatus[r, f] ^= (a == 1)
+        self.temperature[r, f] += (a == 2).astype(np.float64) - (a == 3)
+        newComfort = floorComfort(self.lightStatus[r, f], self.temperature[r, f], self.numOccupants[r, f])
+        newEnergy = floorEnergy(self.lightStatus[r, f], self.temperature[r, f], self.outsideTemperature[r])
+        self.comfort[r, f] = newComfort
+        self.energyUsed[r, f] = newEnergy
+
+        # Same incremental aggregate updates as Building, swap the floor's old contribution for the new one
+        self.totalEnergyUsed[r] = (self.totalEnergyUsed[r] - oldEnergy) + newEnergy
+        self.totalComfort[r] += np.where(newComfort != -1, newComfort, 0) - np.where(oldComfort != -1, oldComfort, 0)
+        self.floorsWithOccupants[r] += (newComfort != -1).astype(np.int64) - (oldComfort != -1)
+        self._updateAverageComfort(r)
+
+        goal = (self.totalEnergyUsed < self.expectedEnergyUsage) & (self.averageComfort >= 1.5)
+        self.terminated[:] = goal | (self.numStepsTaken > 500)
+        rewards = rewardFn(prevComfort, prevEnergy, self.averageComfort, self.totalEnergyUsed, self.expectedEnergyUsage)
+        rewards = np.where(self.terminated, 0.0, rewards)
+        return rewards, self.terminated.copy()
@@ -0,0 +1,216 @@
+import multiprocessing as mp
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from building_batch import BuildingBatch, arrayShapes
+from reward_spec import DEFAULT_REWARD
+
+# Commands the main process hands to the workers through shared memory
+CMD_STEP = 0
+CMD_RESET = 1
+CMD_RECOMPUTE = 2
+CMD_CLOSE = 3
+
+
+def _attachArrays(shm, shapes):
+    # Lays every array out back to back in one shared memory block, each array 8-byte aligned
+    arrays = {}
+    offset = 0
+    for name, shape, dtype in shapes:
+        dtype = np.dtype(dtype)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        offset += -(-int(np.prod(shape)) * dtype.itemsize // 8) * 8
+    return arrays
+
+
+def _blockSize(shapes):
+    return sum(-(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8 for _, shape, dtype in shapes) or 8
+
+
+def _campusShapes(numBuildings, maxFloors):
+    shapes = arrayShapes(numBuildings, maxFloors)
+    # Step inputs/outputs and the command word live in the same block so workers never receive pickled data per step
+    shapes += [
+        ("actionFloor", (numBuildings,), np.int64),
+        ("actionNum", (numBuildings,), np.int64),
+        ("rewards", (numBuildings,), np.float64),
+        ("resetMask", (numBuildings,), np.bool_),
+        ("command", (1,), np.int64),
+    ]
+    return shapes
+
+
+def _worker(shmName, numBuildings, maxFloors, lo, hi, startBarrier, doneBarrier, rewardFn):
+    shm = shared_memory.SharedMemory(name=shmName)
+    arrays = _attachArrays(shm, _campusShapes(numBuildings, maxFloors))
+    # This worker only ever touches its own shard of buildings, so no locking is needed
+    shard = BuildingBatch({name: arrays[name][lo:hi] for name, _, _ in arrayShapes(numBuildings, maxFloors)})
+    initial = {name: array.copy() for name, array in shard.arrays.items()}
+    command = arrays["command"]
+
+    try:
+        while True:
+            startBarrier.wait()
+            cmd = command[0]
+            if cmd == CMD_CLOSE:
+                break
+            elif cmd == CMD_STEP:
+                rewards, _ = shard.step(arrays["actionFloor"][lo:hi], arrays["actionNum"][lo:hi], rewardFn)
+                arrays["rewards"][lo:hi] = rewards
+            elif cmd == CMD_RESET:
+                rows = np.flatnonzero(arrays["resetMask"][lo:hi])
+                # Restores each reset building's initial floors, keeping its current outside temperature feed
+                for name in ("lightStatus", "temperature", "numOccupants"):
+                    shard.arrays[name][rows] = initial[name][rows]
+                shard.recompute(rows)
+                shard.reset(rows)
+            elif cmd == CMD_RECOMPUTE:
+                shard.recompute()
+            doneBarrier.wait()
+    except threading.BrokenBarrierError:
+        # The main process gave up on the campus, nothing left to do
+        pass
+    except BaseException:
+        # Breaks both barriers so the main process raises instead of waiting for this shard forever
+        startBarrier.abort()
+        doneBarrier.abort()
+        raise
+    finally:
+        del shard, arrays, command
+        shm.close()
+
+
+class CampusEnvironment:
+    def __init__(self, buildings, numWorkers=None, rewardFn=DEFAULT_REWARD, timeout=60.0):
+        """
+        Steps a campus of buildings at once. Per-building floor state lives in one multiprocessing.shared_memory block,
+        sharded by building across worker processes that step their shard with BuildingBatch.
+
+        Args:
+            buildings (list): Building objects making up the campus. They are copied into shared memory once and not used afterwards.
+            numWorkers (int): Number of worker processes, defaults to the CPU count (capped at the number of buildings).
+            rewardFn (RewardSpec): Reward evaluated on every shard, or any picklable callable over
+                (prevComfort, prevEnergy, comfort, energy, expectedEnergy) arrays.
+            timeout (float): Seconds to wait for the workers to finish a command before the campus is shut down with an error.
+        """
+        self.timeout = timeout
+        self.numBuildings = len(buildings)
+        self.maxFloors = max(building.getNumFloors() for building in buildings)
+        self.numWorkers = min(numWorkers or mp.cpu_count(), self.numBuildings)
+
+        shapes = _campusShapes(self.numBuildings, self.maxFloors)
+        self.shm = shared_memory.SharedMemory(create=True, size=_blockSize(shapes))
+        self.arrays = _attachArrays(self.shm, shapes)
+        self.batch = BuildingBatch({name: self.arrays[name] for name, _, _ in arrayShapes(self.numBuildings, self.maxFloors)})
+        self.batch.loadBuildings(buildings)
+
+        # Two barriers per command: one releases the workers, the other waits until every shard is done
+        self.startBarrier = mp.Barrier(self.numWorkers + 1)
+        self.doneBarrier = mp.Barrier(self.numWorkers + 1)
+        bounds = np.linspace(0, self.numBuildings, self.numWorkers + 1).astype(int)
+        self.workers = []
+        for w in range(self.numWorkers):
+            process = mp.Process(target=_worker, args=(self.shm.name, self.numBuildings, self.maxFloors, bounds[w], bounds[w + 1],
+                                                       self.startBarrier, self.doneBarrier, rewardFn), daemon=True)
+            process.start()
+            self.workers.append(process)
+        self.closed = False
+
+    def _run(self, cmd):
+        if self.closed:
+            raise RuntimeError("The campus environment is closed")
+        # A worker killed while asleep in a barrier would leave that barrier waiting on it for good, so check first
+        if not all(process.is_alive() for process in self.workers):
+            self._fail()
+        self.arrays["command"][0] = cmd
+        try:
+            self.startBarrier.wait(self.timeout)
+            self.doneBarrier.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            # A failing worker broke the barriers, or one never arrived within the timeout
+            self._fail()
+
+    def _fail(self):
+        failed = self._shutdown()
+        if failed:
+            codes = ", ".join(f"{pid} (exit code {exitcode})" for pid, exitcode in failed)
+            raise RuntimeError(f"Campus worker process died: {codes}") from None
+        raise RuntimeError(f"Campus workers did not finish within {self.timeout}s") from None
+
+    def _shutdown(self):
+        # Waits briefly for the workers to exit (they do after CMD_CLOSE or once the barriers are broken), terminates the rest
+        # and releases the shared memory. Returns (pid, exit code) of the workers that had exited with an error on their own
+        self.closed = True
+        failed = []
+        for process in self.workers:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            elif process.exitcode != 0:
+                failed.append((process.pid, process.exitcode))
+        del self.batch, self.arrays
+        self.shm.close()
+        self.shm.unlink()
+        return failed
+
+    def step(self, actions):
+        """
+        Advances every building by one action. Terminated buildings keep stepping until they are reset.
+
+        Args:
+            actions (array): Shape (numBuildings, 2), one [floorNum, actionNum] per building as in Environment.step.
+
+        Returns:
+            rewards (array), terminated (array) and a dict of campus-wide aggregates.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.numBuildings, 2):
+            raise ValueError(f"Expected actions of shape ({self.numBuildings}, 2), got {actions.shape}")
+        floorNums = actions[:, 0]
+        if np.any((floorNums < 0) | (floorNums >= self.batch.numFloors)):
+            raise ValueError("Action floorNum out of range for its building")
+        self.arrays["actionFloor"][:] = floorNums
+        self.arrays["actionNum"][:] = actions[:, 1]
+        self._run(CMD_STEP)
+        return self.arrays["rewards"].copy(), self.batch.terminated.copy(), self.campusAggregates()
+
+    def reset(self, mask=None):
+        # Resets the buildings selected by mask (all of them by default) back to their initial floors
+        self.arrays["resetMask"][:] = True if mask is None else mask
+        self._run(CMD_RESET)
+        return self.campusAggregates()
+
+    def setOutsideTemperatures(self, temperatures):
+        """
+        Feeds a new outside temperature to every building, then recomputes floor energy and expected energy usage.
+        """
+        self.batch.outsideTemperature[:] = temperatures
+        self._run(CMD_RECOMPUTE)
+
+    def campusAggregates(self):
+        batch = self.batch
+        occupied = batch.floorsWithOccupants.sum()
+        return {
+            "totalEnergyUsed": float(batch.totalEnergyUsed.sum()),
+            "expectedEnergyUsage": float(batch.expectedEnergyUsage.sum()),
+            # Average over every occupied floor on campus, not an average of building averages
+            "averageComfort": float(batch.totalComfort.sum() / occupied) if occupied > 0 else 0.0,
+            "buildingsTerminated": int(batch.terminated.sum()),
+        }
+
+    def close(self):
+        if self.closed:
+            return
+        self.arrays["command"][0] = CMD_CLOSE
+        try:
+            self.startBarrier.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            pass
+        self._shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
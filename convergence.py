@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class ConvergenceMonitor:
+    def __init__(self, maxDeltaTol=1e-3, meanDeltaTol=1e-4, window=20, minEpisodes=0):
+        """
+        Decides when a tabular learner has stopped learning. Every table update reports the size of its change and whether it
+        flipped the greedy action of its row, which costs O(1) per update. An episode counts as quiet when its largest and mean
+        absolute update are within tolerance and no greedy action changed; training has converged after `window` quiet
+        episodes in a row.
+
+        Args:
+            maxDeltaTol (float): Largest absolute update allowed in a quiet episode.
+            meanDeltaTol (float): Mean absolute update allowed in a quiet episode.
+            window (int): Number of consecutive quiet episodes needed to stop.
+            minEpisodes (int): Never stop before this many episodes.
+        """
+        self.maxDeltaTol = maxDeltaTol
+        self.meanDeltaTol = meanDeltaTol
+        self.window = window
+        self.minEpisodes = minEpisodes
+
+        self.episodes = 0
+        self.quietStreak = 0
+        # Episode index training stopped after, None while still running
+        self.stopEpisode = None
+        # Per-episode summaries, one entry per finished episode
+        self.maxDeltas = []
+        self.meanDeltas = []
+        self.greedyChangeCounts = []
+        self._startEpisode()
+
+    def _startEpisode(self):
+        self.episodeMax = 0.0
+        self.episodeSum = 0.0
+        self.episodeCount = 0
+        self.greedyChanges = 0
+
+    def update(self, delta, greedyChanged=False):
+        # One table entry changed by delta
+        delta = abs(delta)
+        if delta > self.episodeMax:
+            self.episodeMax = delta
+        self.episodeSum += delta
+        self.episodeCount += 1
+        self.greedyChanges += bool(greedyChanged)
+
+    def updateBatch(self, deltas, greedyChanges=0):
+        # A minibatch of table entries changed at once, e.g. from a replay update
+        deltas = np.abs(deltas)
+        if len(deltas):
+            self.episodeMax = max(self.episodeMax, float(deltas.max()))
+            self.episodeSum += float(deltas.sum())
+            self.episodeCount += len(deltas)
+        self.greedyChanges += int(greedyChanges)
+
+    def endEpisode(self):
+        """
+        Closes the current episode's statistics. Returns True once training should stop.
+        """
+        meanDelta = self.episodeSum / self.episodeCount if self.episodeCount else 0.0
+        self.maxDeltas.append(float(self.episodeMax))
+        self.meanDeltas.append(float(meanDelta))
+        self.greedyChangeCounts.append(self.greedyChanges)
+
+        quiet = self.episodeMax <= self.maxDeltaTol and meanDelta <= self.meanDeltaTol and self.greedyChanges == 0
+        self.quietStreak = self.quietStreak + 1 if quiet else 0
+        self.episodes += 1
+        self._startEpisode()
+
+        if self.quietStreak >= self.window and self.episodes >= self.minEpisodes:
+            self.stopEpisode = self.episodes - 1
+            return True
+        return False
+
+    @property
+    def converged(self):
+        return self.stopEpisode is not None
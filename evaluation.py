@@ -0,0 +1,161 @@
+import contextlib
+import io
+import multiprocessing as mp
+import numpy as np
+from Environment import Environment, Building, Floor
+from building_batch import BuildingBatch, allocateArrays
+from observation import TEMP_BUCKET_EDGES
+
+METRICS = ("reward", "energyRatio", "comfort", "stepsToGoal", "goalRate")
+
+
+def scenarioBuilding(seed, numFloors=3):
+    """
+    Random but reproducible building for evaluation: outside temperature, and every floor's occupants, lights and temperature
+    are drawn from a generator seeded with `seed`.
+    """
+    rng = np.random.default_rng(seed)
+    outsideTemp = int(rng.integers(-5, 31))
+    building = Building(outsideTemperature=outsideTemp)
+    for _ in range(numFloors):
+        building.addFloor(Floor(building, numOccupants=int(rng.integers(0, 9)), lightStatus=bool(rng.integers(2)),
+                                temperature=int(rng.integers(16, 28)), outsideTemperature=outsideTemp))
+    return building
+
+
+def bootstrapCI(values, numResamples=1000, confidence=0.95, seed=0):
+    # Percentile bootstrap interval of the mean, all resamples drawn at once
+    values = np.asarray(values, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    means = values[rng.integers(len(values), size=(numResamples, len(values)))].mean(axis=1)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(means, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def _greedyTable(artifact):
+    # Greedy actionNum for every (floor, light, temperature bucket). algo2's Q tables index actionNum 1-3 from 0 and its
+    # policy acts on min(Q1, Q2) like in training, algo1's Q and algo3's theta index actionNum directly
+    if isinstance(artifact, tuple):
+        Q1, Q2 = artifact
+        return np.argmax(np.minimum(Q1, Q2), axis=-1) + 1
+    return np.argmax(np.asarray(artifact), axis=-1)
+
+
+def _evaluateTable(artifact, seeds, numFloors, seed):
+    # Every scenario is one row of a BuildingBatch, all of them act on the same step
+    greedy = _greedyTable(artifact)
+    numScenarios = len(seeds)
+    batch = BuildingBatch(allocateArrays(numScenarios, numFloors))
+    batch.loadBuildings([scenarioBuilding(s, numFloors) for s in seeds])
+    rows = batch.rows
+    # Like in training, the floor to act on is picked at random and the policy picks the action
+    rng = np.random.default_rng(seed)
+
+    totalReward = np.zeros(numScenarios)
+    stepsToGoal = np.full(numScenarios, np.nan)
+    active = np.ones(numScenarios, dtype=bool)
+    while active.any():
+        floors = rng.integers(numFloors, size=numScenarios)
+        light = batch.lightStatus[rows, floors].astype(np.intp)
+        bucket = np.digitize(batch.temperature[rows, floors], TEMP_BUCKET_EDGES)
+        # Finished scenarios get no-ops so their final state stays put
+        actions = np.where(active, greedy[floors, light, bucket], 0)
+        rewards, terminated = batch.step(floors, actions)
+        totalReward += np.where(active, rewards, 0.0)
+        goal = active & terminated & (batch.totalEnergyUsed < batch.expectedEnergyUsage) & (batch.averageComfort >= 1.5)
+        stepsToGoal[goal] = batch.numStepsTaken[goal]
+        active &= ~terminated
+
+    return {
+        "reward": totalReward,
+        "energyRatio": batch.totalEnergyUsed / batch.expectedEnergyUsage,
+        "comfort": batch.averageComfort.copy(),
+        "stepsToGoal": stepsToGoal,
+    }
+
+
+_policy = None
+
+
+def _initNetworkWorker(stateDict, stateDim, actionDim):
+    global _policy
+    import torch
+    from algo4 import ActorCritic
+    torch.set_num_threads(1)
+    _policy = ActorCritic(stateDim, actionDim)
+    _policy.load_state_dict(stateDict)
+    _policy.eval()
+
+
+def _runNetworkScenario(args):
+    import torch
+    seed, numFloors = args
+    # Environment prints its action space on creation
+    with contextlib.redirect_stdout(io.StringIO()):
+        env = Environment(scenarioBuilding(seed, numFloors))
+    obs = env.observation
+    totalReward = 0.0
+    while not env.terminated:
+        with torch.no_grad():
+            logits, _ = _policy(torch.from_numpy(obs.vector()))
+        action = int(torch.argmax(logits))
+        _, reward, _ = env.step(env.flatActions[action])
+        totalReward += reward
+    building = env.building
+    stepsToGoal = np.nan if env.truncated else env.numStepsTaken
+    return totalReward, building.totalEnergyUsed / building.expectedEnergyUsage, building.averageComfort, stepsToGoal
+
+
+def _evaluateNetwork(policy, seeds, numFloors, numWorkers):
+    # Scenarios are independent episodes, spread over a process pool that loads the weights once per worker
+    stateDict = {name: tensor.detach().cpu() for name, tensor in policy.state_dict().items()}
+    initargs = (stateDict, policy.fc[0].in_features, policy.pi.out_features)
+    with mp.Pool(numWorkers, initializer=_initNetworkWorker, initargs=initargs) as pool:
+        results = np.array(pool.map(_runNetworkScenario, [(s, numFloors) for s in seeds]), dtype=np.float64).reshape(-1, 4)
+    return {name: results[:, i] for i, name in enumerate(METRICS[:4])}
+
+
+def evaluatePolicy(artifact, numScenarios=100, seed=0, numWorkers=None, numResamples=1000, confidence=0.95):
+    """
+    Runs a learned policy greedily on seeded random scenarios and summarizes how it does.
+
+    Args:
+        artifact: What an algorithm returned, algo1's Q, algo2's (Q1, Q2) tuple, algo3's theta or an algo4 ActorCritic.
+            Tabular artifacts are evaluated on all scenarios at once with BuildingBatch, networks over a process pool.
+        numScenarios (int): Number of scenarios (one greedy episode each).
+        seed (int): Seeds the scenarios, the same seed always gives the same scenarios.
+        numWorkers (int): Process pool size for networks, defaults to the CPU count.
+        numResamples (int): Bootstrap resamples per confidence interval.
+        confidence (float): Confidence level of the intervals.
+
+    Returns:
+        dict: {metric: {"mean", "low", "high"}} for the episode reward, final energy used / expectedEnergyUsage, final average
+        comfort, steps to reach the goal (over the scenarios that did) and the fraction of scenarios that reached the goal.
+    """
+    seeds = [seed * numScenarios + i for i in range(numScenarios)]
+    if isinstance(artifact, (np.ndarray, tuple)):
+        numFloors = (artifact[0] if isinstance(artifact, tuple) else artifact).shape[0]
+        metrics = _evaluateTable(artifact, seeds, numFloors, seed)
+    else:
+        numFloors = artifact.pi.out_features // 3
+        metrics = _evaluateNetwork(artifact, seeds, numFloors, numWorkers or mp.cpu_count())
+    metrics["goalRate"] = (~np.isnan(metrics["stepsToGoal"])).astype(np.float64)
+
+    report = {"numScenarios": numScenarios}
+    for name in METRICS:
+        values = metrics[name][~np.isnan(metrics[name])]
+        if len(values) == 0:
+            report[name] = {"mean": float("nan"), "low": float("nan"), "high": float("nan")}
+            continue
+        low, high = bootstrapCI(values, numResamples, confidence, seed)
+        report[name] = {"mean": float(values.mean()), "low": low, "high": high}
+    return report
+
+
+def formatReport(report):
+    lines = [f"Greedy evaluation over {report['numScenarios']} scenarios:"]
+    for name in METRICS:
+        stats = report[name]
+        lines.append(f"  {name:<12} {stats['mean']:10.3f}  [{stats['low']:.3f}, {stats['high']:.3f}]")
+    return "\n".join(lines)
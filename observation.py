@@ -0,0 +1,84 @@
+import numpy as np
+
+# Temperature buckets used by the tabular learners: below 20, 20-22 and 23 or above
+NUM_TEMP_BUCKETS = 3
+# Lower edges of the upper buckets, np.digitize(temperatures, TEMP_BUCKET_EDGES) matches tempBucket
+TEMP_BUCKET_EDGES = (20, 23)
+# Fixed feature scaling for the dense vector, replaces renormalizing every vector by its own mean/std
+COMFORT_TEMPERATURE = 21.0
+TEMPERATURE_SCALE = 10.0
+OCCUPANT_SCALE = 10.0
+COMFORT_SCALE = 2.0
+FLOOR_FEATURES = 3
+
+
+def tempBucket(temperature):
+    if temperature < 20:
+        return 0
+    elif temperature < 23:
+        return 1
+    return 2
+
+
+class ObservationEncoder:
+    def __init__(self, building):
+        """
+        Encodes a Building into the discrete per-floor indices used by the tabular algos and the dense float32 vector used by algo4.
+        Both live in preallocated arrays that are refreshed one floor at a time as the building changes.
+
+        Args:
+            building (Building): The building to encode.
+        """
+        self.numFloors = 0
+        self.reset(building)
+
+    def reset(self, building):
+        # Full refresh, needed whenever the Building object is replaced (Environment.reset) or changed outside of Environment.step
+        self.building = building
+        numFloors = building.getNumFloors()
+        if numFloors != self.numFloors:
+            self.numFloors = numFloors
+            self.vectorSize = 1 + FLOOR_FEATURES * numFloors + 2
+            self.lightIndex = np.zeros(numFloors, dtype=np.int8)
+            self.tempIndex = np.zeros(numFloors, dtype=np.int8)
+            self.features = np.zeros(self.vectorSize, dtype=np.float32)
+            # Per-floor view into features, row i holds floor i's (light, temperature, occupants)
+            self.floorFeatures = self.features[1:1 + FLOOR_FEATURES * numFloors].reshape(numFloors, FLOOR_FEATURES)
+
+        for floorNum in range(numFloors):
+            self._encodeFloor(floorNum)
+        self._encodeAggregates()
+
+    def _encodeFloor(self, floorNum):
+        floor = self.building.floors[floorNum]
+        self.lightIndex[floorNum] = 1 if floor.lightStatus else 0
+        self.tempIndex[floorNum] = tempBucket(floor.temperature)
+        row = self.floorFeatures[floorNum]
+        row[0] = 1.0 if floor.lightStatus else 0.0
+        row[1] = (floor.temperature - COMFORT_TEMPERATURE) / TEMPERATURE_SCALE
+        row[2] = floor.numOccupants / OCCUPANT_SCALE
+
+    def _encodeAggregates(self):
+        building = self.building
+        self.features[0] = (building.outsideTemperature - COMFORT_TEMPERATURE) / TEMPERATURE_SCALE
+        self.features[-2] = building.totalEnergyUsed / max(building.expectedEnergyUsage, 1e-8)
+        self.features[-1] = building.averageComfort / COMFORT_SCALE
+
+    def updateFloor(self, floorNum):
+        """
+        Re-encodes a single floor and the building aggregates after that floor changed.
+        """
+        self._encodeFloor(floorNum)
+        self._encodeAggregates()
+
+    def floorIndex(self, floorNum):
+        """
+        Returns the (floor, light status, temperature bucket) index used to address the tabular Q/theta arrays.
+        """
+        return floorNum, self.lightIndex[floorNum], self.tempIndex[floorNum]
+
+    def vector(self):
+        """
+        Returns the dense float32 feature vector. This is the encoder's own buffer, copy it if it has to outlive the next step.
+        """
+        return self.features
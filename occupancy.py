@@ -0,0 +1,121 @@
+import heapq
+import random
+
+# Event kinds, stored in the heap as (time, sequence, kind, occupant, floor)
+ARRIVE = 0
+MOVE = 1
+DEPART = 2
+
+HOURS_PER_DAY = 24.0
+DAYS_PER_WEEK = 7
+
+
+class OccupancySimulator:
+    def __init__(self, numFloors, numOccupants, seed=None, stepHours=1/60, arrivalHour=9.0, departureHour=17.0,
+                 scheduleSpread=0.75, meanStayHours=2.0, weekendsOff=True):
+        """
+        Discrete-event occupancy simulation. Every occupant has exactly one pending event in a heap-based scheduler:
+        arriving at a floor in the morning, moving between floors during the day and leaving in the evening.
+        advance() only pops the events that are due, so a step costs O(events due * log occupants) rather than O(occupants).
+
+        Args:
+            numFloors (int): Number of floors occupants are spread over.
+            numOccupants (int): Number of people working in the building.
+            seed (int): Seed for the simulator's random generator, same seed gives the same occupancy trace.
+            stepHours (float): Simulated time per environment step in hours.
+            arrivalHour (float): Mean arrival time of day.
+            departureHour (float): Mean departure time of day.
+            scheduleSpread (float): Standard deviation in hours of individual arrival and departure times.
+            meanStayHours (float): Mean time spent on a floor before moving to another one.
+            weekendsOff (bool): Nobody comes in on the last two days of each week.
+        """
+        self.numFloors = numFloors
+        self.numOccupants = numOccupants
+        self.rng = random.Random(seed)
+        self.stepHours = stepHours
+        self.arrivalHour = arrivalHour
+        self.departureHour = departureHour
+        self.scheduleSpread = scheduleSpread
+        self.meanStayHours = meanStayHours
+        self.weekendsOff = weekendsOff
+
+        self.time = 0.0
+        # Plain lists, the event loop does scalar reads and writes which are much cheaper on lists than numpy arrays
+        self.counts = [0] * numFloors
+        # Floor each occupant is on, -1 while outside the building
+        self.location = [-1] * numOccupants
+        self.departureTimes = [0.0] * numOccupants
+        self.events = []
+        self.sequence = 0
+        for occupant in range(numOccupants):
+            self._scheduleArrival(occupant, day=0)
+
+    def _push(self, time, kind, occupant, floor):
+        # The sequence number breaks ties so events at the same time pop in scheduling order
+        heapq.heappush(self.events, (time, self.sequence, kind, occupant, floor))
+        self.sequence += 1
+
+    def _scheduleArrival(self, occupant, day):
+        while self.weekendsOff and day % DAYS_PER_WEEK >= DAYS_PER_WEEK - 2:
+            day += 1
+        dayStart = day * HOURS_PER_DAY
+        arrival = dayStart + self.rng.gauss(self.arrivalHour, self.scheduleSpread)
+        departure = dayStart + self.rng.gauss(self.departureHour, self.scheduleSpread)
+        self.departureTimes[occupant] = max(departure, arrival)
+        self._push(arrival, ARRIVE, occupant, self.rng.randrange(self.numFloors))
+
+    def _scheduleNext(self, occupant, now):
+        # Either move to another floor after an exponential stay, or leave if the departure time comes first
+        moveTime = now + self.rng.expovariate(1.0 / self.meanStayHours)
+        departure = self.departureTimes[occupant]
+        if moveTime < departure and self.numFloors > 1:
+            target = self.rng.randrange(self.numFloors - 1)
+            if target >= self.location[occupant]:
+                target += 1
+            self._push(moveTime, MOVE, occupant, target)
+        else:
+            self._push(departure, DEPART, occupant, -1)
+
+    def advance(self, until=None):
+        """
+        Processes every event up to time `until` (one step ahead by default).
+        Returns {floorNum: new occupant count} for the floors whose count actually changed.
+        """
+        until = self.time + self.stepHours if until is None else until
+        events = self.events
+        counts = self.counts
+        location = self.location
+        # Count of every touched floor before this advance
+        before = {}
+
+        while events and events[0][0] <= until:
+            time, _, kind, occupant, floor = heapq.heappop(events)
+            previous = location[occupant]
+            if previous >= 0:
+                before.setdefault(previous, counts[previous])
+                counts[previous] -= 1
+            if kind == DEPART:
+                location[occupant] = -1
+                self._scheduleArrival(occupant, int(time // HOURS_PER_DAY) + 1)
+            else:
+                before.setdefault(floor, counts[floor])
+                location[occupant] = floor
+                counts[floor] += 1
+                self._scheduleNext(occupant, time)
+
+        self.time = until
+        # An arrival and a departure on the same floor within one step cancel out, those floors are left alone
+        return {floorNum: counts[floorNum] for floorNum, count in before.items() if counts[floorNum] != count}
+
+    def apply(self, building, changes=None):
+        """
+        Writes occupant counts into the building through Floor.setOccupants, which updates comfort and the building aggregates.
+        Only the floors in changes are touched, or every floor that differs from the simulation when changes is None.
+        Returns the floor numbers that were updated.
+        """
+        if changes is None:
+            changes = {floorNum: self.counts[floorNum] for floorNum in range(self.numFloors)
+                       if building.floors[floorNum].numOccupants != self.counts[floorNum]}
+        for floorNum, count in changes.items():
+            building.floors[floorNum].setOccupants(count)
+        return list(changes)
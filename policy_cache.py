@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def softmax(x):
+    #to convert a vector into probability distribution, or each row of a batch into one
+    #first stabilize by subtracting the max value from x to avoid large exponenTS
+    z = x - np.max(x, axis=-1, keepdims=True)
+    return np.exp(z) / np.sum(np.exp(z), axis=-1, keepdims=True)
+
+
+class PolicyCache:
+    def __init__(self, preferences):
+        """
+        Softmax policy and cumulative probability tables for every state of a tabular learner, so action selection is a
+        row lookup plus one uniform draw instead of a softmax per step. The tables are built in one vectorized pass and only
+        the rows whose preferences changed have to be refreshed afterwards.
+
+        Args:
+            preferences (array): Shape (..., numActions), the softmax logits of every state, e.g. theta or min(Q1, Q2) / alpha.
+        """
+        self.shape = preferences.shape
+        self.probs = np.empty(self.shape)
+        self.cdf = np.empty(self.shape)
+        # (state index, action) views, for rows addressed by flat state index like in the replay updates
+        self.probsFlat = self.probs.reshape(-1, self.shape[-1])
+        self.cdfFlat = self.cdf.reshape(-1, self.shape[-1])
+        self.refresh(preferences)
+
+    def refresh(self, preferences):
+        # Rebuilds every row
+        self.probs[...] = softmax(preferences)
+        self._cumulate(self.probs, self.cdf)
+
+    def refreshRow(self, index, preferences):
+        # index is a state index tuple such as (floor, light, temperature bucket)
+        self.probs[index] = softmax(preferences)
+        self.cdf[index] = np.cumsum(self.probs[index])
+        self.cdf[index] /= self.cdf[index][-1]
+
+    def refreshRows(self, rows, preferences):
+        # rows are flat state indices, preferences has one row per index
+        probs = softmax(preferences)
+        cdf = np.empty_like(probs)
+        self._cumulate(probs, cdf)
+        self.probsFlat[rows] = probs
+        self.cdfFlat[rows] = cdf
+
+    @staticmethod
+    def _cumulate(probs, cdf):
+        # Normalized by the last entry so rounding can never leave a draw past the end, as np.random.choice does
+        np.cumsum(probs, axis=-1, out=cdf)
+        cdf /= cdf[..., -1:]
+
+    def sample(self, index):
+        """
+        Draws an action for the state at index. Consumes one np.random uniform draw and picks the same action as
+        np.random.choice(numActions, p=self.probs[index]) would with the same random state.
+        """
+        return int(self.cdf[index].searchsorted(np.random.random_sample(), side="right"))
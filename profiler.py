@@ -0,0 +1,106 @@
+import time
+from collections import defaultdict
+
+
+class _NullPhase:
+    # Shared do-nothing context manager handed out while profiling is disabled
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        stack = self.profiler.stack
+        path = tuple(stack)
+        self.profiler.totals[path] += elapsed
+        self.profiler.counts[path] += 1
+        stack.pop()
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False):
+        """
+        Named, nestable phase timers. Wrap code in `with profiler.phase("name"):`, nested phases are recorded under their parent.
+        While disabled, phase() returns a shared no-op context manager so instrumented code pays almost nothing.
+
+        Args:
+            enabled (bool): Whether phases are timed from the start.
+        """
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stack = []
+        # Keyed by the full phase path, e.g. ("env_step", "apply_action"). Times are inclusive of child phases, in nanoseconds
+        self.totals = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def selfTimes(self):
+        # Inclusive time minus the time spent in direct children
+        selfTimes = dict(self.totals)
+        for path, total in self.totals.items():
+            if len(path) > 1:
+                selfTimes[path[:-1]] -= total
+        return selfTimes
+
+    def folded(self):
+        """
+        Returns the profile in the folded stack format read by flamegraph.pl and speedscope, one "a;b;c microseconds" line per phase path.
+        """
+        lines = []
+        for path, selfTime in sorted(self.selfTimes().items()):
+            lines.append(f"{';'.join(path)} {max(selfTime, 0) // 1000}")
+        return "\n".join(lines)
+
+    def table(self):
+        """
+        Returns a per-phase breakdown with call counts, inclusive and self time and the share of the total top level time.
+        """
+        selfTimes = self.selfTimes()
+        rootTotal = sum(total for path, total in self.totals.items() if len(path) == 1) or 1
+        lines = [f"{'Phase':<40}{'Calls':>10}{'Total (s)':>12}{'Self (s)':>12}{'% Total':>9}"]
+        for path in sorted(self.totals):
+            name = "  " * (len(path) - 1) + path[-1]
+            total = self.totals[path]
+            lines.append(f"{name:<40}{self.counts[path]:>10}{total / 1e9:>12.4f}{selfTimes[path] / 1e9:>12.4f}{100 * total / rootTotal:>8.1f}%")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            f.write(self.folded() + "\n")
+
+
+# Process-wide profiler used by the algos and Environment.step, disabled unless TestBed (or a caller) enables it
+PROFILER = Profiler()
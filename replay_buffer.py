@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class SumTree:
+    def __init__(self, capacity):
+        """
+        Array backed binary sum tree used for proportional prioritized sampling.
+        Leaves hold the priorities, every internal node holds the sum of its children, so sampling and updates are O(log capacity).
+
+        Args:
+            capacity (int): Number of leaves (transitions) the tree can hold.
+        """
+        self.capacity = capacity
+        # Round the leaf count up to a power of two so every leaf sits at the same depth
+        self.numLeaves = 1
+        while self.numLeaves < capacity:
+            self.numLeaves *= 2
+        self.tree = np.zeros(2 * self.numLeaves, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        # Writes leaves then recomputes the parents level by level, vectorized over the batch
+        nodes = np.asarray(indices) + self.numLeaves
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        # Descends from the root for every value at once, returns the leaf indices
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        while nodes[0] < self.numLeaves:
+            left = 2 * nodes
+            leftSum = self.tree[left]
+            goRight = values > leftSum
+            values = np.where(goRight, values - leftSum, values)
+            nodes = np.where(goRight, left + 1, left)
+        return np.minimum(nodes - self.numLeaves, self.capacity - 1)
+
+
+class ReplayBuffer:
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4, seed=None):
+        """
+        Fixed capacity ring buffer of tabular transitions stored as a struct of numpy arrays.
+
+        Args:
+            capacity (int): Maximum number of transitions kept, the oldest are overwritten first.
+            prioritized (bool): Sample proportionally to |TD error|^alpha using a SumTree instead of uniformly.
+            alpha (float): How strongly priorities skew sampling, 0 is uniform.
+            beta (float): Importance sampling correction exponent for prioritized sampling.
+            seed (int): Seed for the buffer's sampling generator.
+        """
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.nextStates = np.zeros(capacity, dtype=np.int32)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+
+        self.position = 0
+        self.size = 0
+        if prioritized:
+            self.tree = SumTree(capacity)
+            self.maxPriority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, nextState, done):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.nextStates[i] = nextState
+        self.dones[i] = done
+        # New transitions get the highest priority seen so far so they are replayed at least once
+        if self.prioritized:
+            self.tree.update([i], [self.maxPriority])
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batchSize):
+        """
+        Samples a minibatch. Returns (indices, states, actions, rewards, nextStates, dones, weights) where weights are the
+        importance sampling weights (all ones when sampling uniformly).
+        """
+        if self.prioritized:
+            # Stratified sampling, one draw from each equal slice of the total priority mass
+            total = self.tree.total()
+            bounds = np.linspace(0, total, batchSize + 1)
+            values = self.rng.uniform(bounds[:-1], bounds[1:])
+            indices = np.minimum(self.tree.find(values), self.size - 1)
+            probs = self.tree.tree[indices + self.tree.numLeaves] / total
+            weights = (self.size * probs) ** (-self.beta)
+            weights /= weights.max()
+        else:
+            indices = self.rng.integers(0, self.size, size=batchSize)
+            weights = np.ones(batchSize)
+
+        return indices, self.states[indices], self.actions[indices], self.rewards[indices], self.nextStates[indices], self.dones[indices], weights
+
+    def updatePriorities(self, indices, tdErrors, eps=1e-3):
+        if not self.prioritized:
+            return
+        priorities = (np.abs(tdErrors) + eps) ** self.alpha
+        # Duplicate indices in a batch keep the last written priority, same as sequential updates would
+        self.tree.update(indices, priorities)
+        self.maxPriority = max(self.maxPriority, priorities.max())
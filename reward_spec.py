@@ -0,0 +1,86 @@
+import json
+
+# Names a reward term may compare. excessEnergy is energy - expectedEnergy
+VARIABLES = ("comfort", "prevComfort", "energy", "prevEnergy", "expectedEnergy", "excessEnergy")
+OPERATORS = ("<", "<=", ">", ">=", "==", "!=")
+
+# The reward Environment.computeReward has always used, one term per rule in the same order.
+# A term adds its weight when every condition in "when" holds.
+DEFAULT_REWARD_TERMS = [
+    # Did the action improve on the state, i.e. get closer to the goal?
+    {"weight": 0.1, "when": [["prevComfort", "<", "comfort"]]},
+    {"weight": 0.1, "when": [["prevEnergy", ">", "energy"]]},
+    # Did the action reach an optimal state? big reward
+    {"weight": 1.0, "when": [["energy", "<", "expectedEnergy"]]},
+    {"weight": 1.0, "when": [["comfort", ">", 1.5]]},
+    # Comfort between uncomfortable and high comfort that keeps dropping, and uncomfortable buildings
+    {"weight": -0.1, "when": [["comfort", "<", 2], ["comfort", ">", 1], ["prevComfort", ">", "comfort"]]},
+    {"weight": -1.0, "when": [["comfort", "<", 1]]},
+    # Energy going up, with a bigger punishment once it is more than 2 kW/h above the expected usage
+    {"weight": -1.0, "when": [["prevEnergy", "<", "energy"], ["excessEnergy", ">", 2]]},
+    {"weight": -0.1, "when": [["prevEnergy", "<", "energy"], ["excessEnergy", "<=", 2]]},
+]
+
+
+def _operand(value):
+    if isinstance(value, str):
+        if value not in VARIABLES:
+            raise ValueError(f"Unknown reward variable: {value}")
+        return "(energy - expectedEnergy)" if value == "excessEnergy" else value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Reward operands must be variable names or numbers, got {value!r}")
+    return repr(float(value))
+
+
+class RewardSpec:
+    def __init__(self, terms):
+        """
+        Declarative reward: a list of weighted terms, each a conjunction of comparisons between building aggregates and thresholds.
+        The terms are compiled once into a single arithmetic expression, so the same spec evaluates Python floats for
+        Environment and NumPy arrays for BuildingBatch/CampusEnvironment without any per-step branching.
+
+        Args:
+            terms (list): Dicts with a "weight" and a "when" list of [lhs, operator, rhs] conditions. Operands are names from
+                VARIABLES or numbers, see DEFAULT_REWARD_TERMS.
+        """
+        self.terms = [{"weight": float(term["weight"]), "when": [list(condition) for condition in term["when"]]} for term in terms]
+        self._compile()
+
+    def _compile(self):
+        parts = []
+        for term in self.terms:
+            conditions = []
+            for lhs, operator, rhs in term["when"]:
+                if operator not in OPERATORS:
+                    raise ValueError(f"Unknown reward operator: {operator}")
+                conditions.append(f"({_operand(lhs)} {operator} {_operand(rhs)})")
+            # An empty condition list is a constant term
+            mask = " & ".join(conditions) if conditions else "True"
+            parts.append(f"{term['weight']!r} * ({mask})")
+        self.source = "0.0 + " + " + ".join(parts) if parts else "0.0"
+        # Operands were whitelisted above, so the expression only ever sees the five arguments
+        self._evaluate = eval(compile(f"lambda prevComfort, prevEnergy, comfort, energy, expectedEnergy: {self.source}", "<reward spec>", "eval"),
+                              {"__builtins__": {}})
+
+    def __call__(self, prevComfort, prevEnergy, comfort, energy, expectedEnergy):
+        return self._evaluate(prevComfort, prevEnergy, comfort, energy, expectedEnergy)
+
+    # The compiled function can't be pickled, worker processes recompile from the terms
+    def __getstate__(self):
+        return {"terms": self.terms}
+
+    def __setstate__(self, state):
+        self.terms = state["terms"]
+        self._compile()
+
+    def toJson(self, path):
+        with open(path, "w") as f:
+            json.dump(self.terms, f, indent=2)
+
+    @classmethod
+    def fromJson(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+DEFAULT_REWARD = RewardSpec(DEFAULT_REWARD_TERMS)
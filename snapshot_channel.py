@@ -0,0 +1,113 @@
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from Environment import Building, Floor
+
+# Per-floor arrays in the snapshot, followed by the building aggregates
+FLOOR_FIELDS = ("lightStatus", "temperature", "numOccupants", "comfort", "energyUsed")
+BUILDING_FIELDS = ("outsideTemperature", "expectedEnergyUsage", "totalEnergyUsed", "averageComfort")
+# int64 header: sequence number and closed flag
+HEADER_SIZE = 2
+
+
+def _number(value):
+    # Whole numbers come back as ints, the GUI formats temperatures and counts the way the Building holds them
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class SnapshotChannel:
+    def __init__(self, numFloors, name=None, minInterval=0.1):
+        """
+        One-writer, many-reader channel publishing a fixed-layout snapshot of a building through shared memory.
+        Writes are guarded by a sequence number (a seqlock): it is odd while a write is in progress, and readers retry until
+        they copied the data between two equal even values. Neither side ever blocks the other.
+
+        Args:
+            numFloors (int): Number of floors in the published buildings.
+            name (str): Name of an existing channel to attach to, a new one is created when None.
+            minInterval (float): Minimum seconds between two publishes, anything more frequent is dropped.
+        """
+        self.numFloors = numFloors
+        self.minInterval = minInterval
+        dataSize = len(FLOOR_FIELDS) * numFloors + len(BUILDING_FIELDS)
+        size = (HEADER_SIZE + dataSize) * 8
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.name = self.shm.name
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((dataSize,), dtype=np.float64, buffer=self.shm.buf, offset=HEADER_SIZE * 8)
+        self.floorData = self.data[:len(FLOOR_FIELDS) * numFloors].reshape(len(FLOOR_FIELDS), numFloors)
+        self.buildingData = self.data[len(FLOOR_FIELDS) * numFloors:]
+        if self.owner:
+            self.header[:] = 0
+        self.lastPublish = float("-inf")
+        self.lastSequence = -1
+
+    def publish(self, building, force=False):
+        """
+        Writes the building's current state unless the last publish was less than minInterval ago.
+        Returns True if the snapshot was written.
+        """
+        now = time.monotonic()
+        if not force and now - self.lastPublish < self.minInterval:
+            return False
+        self.lastPublish = now
+        floorData = self.floorData
+        self.header[0] += 1
+        for i, floor in enumerate(building.floors):
+            floorData[0, i] = floor.lightStatus
+            floorData[1, i] = floor.temperature
+            floorData[2, i] = floor.numOccupants
+            floorData[3, i] = floor.comfort
+            floorData[4, i] = floor.energyUsed
+        self.buildingData[:] = (building.outsideTemperature, building.expectedEnergyUsage, building.totalEnergyUsed, building.averageComfort)
+        self.header[0] += 1
+        return True
+
+    def read(self):
+        """
+        Returns a consistent copy of the latest snapshot as (sequence, floor arrays, building aggregates), or None if
+        nothing new was published since the last read.
+        """
+        while True:
+            sequence = int(self.header[0])
+            if sequence == self.lastSequence or sequence == 0:
+                return None
+            if sequence % 2:
+                # A write is in progress, it only takes microseconds
+                continue
+            floorData = self.floorData.copy()
+            buildingData = self.buildingData.copy()
+            if int(self.header[0]) == sequence:
+                self.lastSequence = sequence
+                return sequence, floorData, buildingData
+
+    def readBuilding(self):
+        """
+        Latest snapshot rebuilt as a Building (comfort and energy recomputed from the published floor state), or None if
+        nothing new was published since the last read.
+        """
+        snapshot = self.read()
+        if snapshot is None:
+            return None
+        _, floorData, buildingData = snapshot
+        outsideTemp = _number(buildingData[0])
+        building = Building(outsideTemperature=outsideTemp)
+        for i in range(self.numFloors):
+            building.addFloor(Floor(building, numOccupants=int(floorData[2, i]), lightStatus=bool(floorData[0, i]),
+                                    temperature=_number(floorData[1, i]), outsideTemperature=outsideTemp))
+        return building
+
+    @property
+    def closed(self):
+        return bool(self.header[1])
+
+    def close(self):
+        # Tells readers the writer is done, then releases this side's mapping. The creator also removes the segment
+        if self.owner:
+            self.header[1] = 1
+        del self.header, self.data, self.floorData, self.buildingData
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
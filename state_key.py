@@ -0,0 +1,70 @@
+import numpy as np
+from observation import tempBucket, NUM_TEMP_BUCKETS
+
+# Occupancy buckets: empty, 1-4 occupants, 5 or more
+NUM_OCCUPANCY_BUCKETS = 3
+NUM_LIGHT_STATES = 2
+# Each floor is one digit of the joint key, ordered (light, temperature bucket, occupancy bucket)
+FLOOR_RADIX = NUM_LIGHT_STATES * NUM_TEMP_BUCKETS * NUM_OCCUPANCY_BUCKETS
+
+
+def occupancyBucket(numOccupants):
+    if numOccupants == 0:
+        return 0
+    elif numOccupants < 5:
+        return 1
+    return 2
+
+
+def floorDigit(floor):
+    light = 1 if floor.lightStatus else 0
+    return (light * NUM_TEMP_BUCKETS + tempBucket(floor.temperature)) * NUM_OCCUPANCY_BUCKETS + occupancyBucket(floor.numOccupants)
+
+
+def numStates(numFloors):
+    """
+    Number of distinct joint keys for a building with numFloors floors, i.e. the size of a dense joint-state table.
+    """
+    return FLOOR_RADIX ** numFloors
+
+
+def decodeKey(key, numFloors):
+    """
+    Decodes a joint key back into a (numFloors, 3) array of (light status, temperature bucket, occupancy bucket) per floor.
+    """
+    floorStates = np.zeros((numFloors, 3), dtype=np.int64)
+    for floorNum in range(numFloors):
+        key, digit = divmod(key, FLOOR_RADIX)
+        rest, floorStates[floorNum, 2] = divmod(digit, NUM_OCCUPANCY_BUCKETS)
+        floorStates[floorNum, 0], floorStates[floorNum, 1] = divmod(rest, NUM_TEMP_BUCKETS)
+    return floorStates
+
+
+class StateKey:
+    def __init__(self):
+        """
+        Mixed-radix encoding of a whole building into one integer, floor i being digit i in base FLOOR_RADIX.
+        Building keeps one of these and every Floor mutation updates its digit in O(1).
+        Python ints are unbounded, so the key stays exact for any number of floors.
+        """
+        self.digits = []
+        self.placeValues = []
+        self.key = 0
+
+    def addFloor(self, floor):
+        self.placeValues.append(FLOOR_RADIX ** len(self.digits))
+        self.digits.append(0)
+        self.updateFloor(len(self.digits) - 1, floor)
+
+    def updateFloor(self, floorNum, floor):
+        digit = floorDigit(floor)
+        self.key += (digit - self.digits[floorNum]) * self.placeValues[floorNum]
+        self.digits[floorNum] = digit
+
+    def reset(self, building):
+        # Full recompute, used when floors were changed without going through the Floor methods
+        self.digits = []
+        self.placeValues = []
+        self.key = 0
+        for floor in building.floors:
+            self.addFloor(floor)
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class ThermalModel:
+    def __init__(self, numFloors, stepHours=1/60, capacitance=2.0, outsideResistance=5.0, floorResistance=2.0, occupantHeatGain=0.1):
+        """
+        RC network thermal model of a building. Every floor is a node with a heat capacity, coupled to the outside air and
+        to the floors directly above and below through thermal resistances, and heated by its occupants:
+
+            C_i dT_i/dt = (T_out - T_i) / R_out_i + sum_j (T_j - T_i) / R_floor + occupantHeatGain * n_i
+
+        The linear system is integrated exactly with a matrix exponential over all floors at once, precomputed here, so each
+        step costs two small matrix-vector products no matter how tall the building is.
+
+        Args:
+            numFloors (int): Number of floors, floor i is adjacent to floors i-1 and i+1.
+            stepHours (float): Simulated time per environment step in hours.
+            capacitance (float or array): Heat capacity per floor in kWh/°C.
+            outsideResistance (float or array): Resistance between each floor and the outside air in °C/kW.
+            floorResistance (float): Resistance between adjacent floors in °C/kW.
+            occupantHeatGain (float): Heat given off per occupant in kW.
+        """
+        self.numFloors = numFloors
+        self.stepHours = stepHours
+        self.occupantHeatGain = occupantHeatGain
+        capacitance = np.broadcast_to(np.asarray(capacitance, dtype=np.float64), (numFloors,))
+        self.outsideConductance = 1.0 / np.broadcast_to(np.asarray(outsideResistance, dtype=np.float64), (numFloors,))
+
+        # Conductance matrix K (graph Laplacian of the floor chain plus the outside losses), so that C dT/dt = -K T + inputs
+        K = np.diag(self.outsideConductance.copy())
+        if numFloors > 1:
+            g = 1.0 / floorResistance
+            i = np.arange(numFloors - 1)
+            K[i, i] += g
+            K[i + 1, i + 1] += g
+            K[i, i + 1] -= g
+            K[i + 1, i] -= g
+
+        # A = -C^-1 K is similar to the symmetric -C^-1/2 K C^-1/2, so one eigendecomposition gives both expm(A dt) and A^-1
+        cHalf = np.sqrt(capacitance)
+        S = K / np.outer(cHalf, cHalf)
+        eigenvalues, V = np.linalg.eigh(S)
+        left = V / cHalf[:, None]
+        right = V.T * cHalf[None, :]
+        # Transition matrix over one step and the inverse conductance matrix used for the steady state
+        self.transition = (left * np.exp(-eigenvalues * stepHours)) @ right
+        self.inverseConductance = np.linalg.inv(K)
+
+        self.temperatures = np.zeros(numFloors)
+        self.rounded = np.zeros(numFloors, dtype=np.int64)
+
+    def reset(self, building):
+        self.temperatures = np.array([floor.temperature for floor in building.floors], dtype=np.float64)
+        self.rounded = np.rint(self.temperatures).astype(np.int64)
+
+    def nudge(self, floorNum, delta):
+        # Applies a direct temperature change, e.g. the agent's increase/decrease actions
+        self.temperatures[floorNum] += delta
+        self.rounded[floorNum] += delta
+
+    def steadyState(self, outsideTemperature, occupants):
+        heatInput = self.outsideConductance * outsideTemperature + self.occupantHeatGain * occupants
+        return self.inverseConductance @ heatInput
+
+    def advance(self, outsideTemperature, occupants):
+        """
+        Advances every floor by one step, with outside temperature and occupancy held constant over the step.
+        Returns the indices of floors whose whole-degree temperature changed and their new whole-degree temperatures.
+        """
+        steady = self.steadyState(outsideTemperature, occupants)
+        self.temperatures = steady + self.transition @ (self.temperatures - steady)
+        rounded = np.rint(self.temperatures).astype(np.int64)
+        changed = np.flatnonzero(rounded != self.rounded)
+        self.rounded = rounded
+        return changed, rounded[changed]
@@ -0,0 +1,69 @@
+import math
+import numpy as np
+
+
+class TileCoder:
+    def __init__(self, numTilings=8, memorySize=4096, temperatureWidth=2.0, occupantWidth=2.0, outsideWidth=5.0):
+        """
+        Hashed tile coding of a single floor's state: its temperature, occupants and outside temperature are covered by
+        numTilings offset grids, with the light status as an extra discrete coordinate. Every state activates exactly
+        numTilings features, hashed into a fixed memorySize, so memory doesn't grow with the number of floors and an update
+        only touches the active features. Floors share features, what is learned on one floor generalizes to the others.
+
+        Args:
+            numTilings (int): Number of offset tilings, i.e. active features per state.
+            memorySize (int): Number of hashed features.
+            temperatureWidth (float): Tile width for the floor temperature in °C.
+            occupantWidth (float): Tile width for the number of occupants.
+            outsideWidth (float): Tile width for the outside temperature in °C.
+        """
+        self.numTilings = numTilings
+        self.memorySize = memorySize
+        self.widths = (temperatureWidth, occupantWidth, outsideWidth)
+
+    def tiles(self, values, discrete=()):
+        """
+        Active feature indices for continuous values (in tile widths) and extra discrete coordinates, as in Sutton's tiles3.
+        """
+        numTilings = self.numTilings
+        quantized = [math.floor(value * numTilings) for value in values]
+        active = np.empty(numTilings, dtype=np.intp)
+        for tiling in range(numTilings):
+            # Each dimension is offset by a different odd multiple of the tiling, which spreads the tilings asymmetrically
+            coords = [tiling]
+            offset = tiling
+            for q in quantized:
+                coords.append((q + offset) // numTilings)
+                offset += tiling * 2
+            coords.extend(discrete)
+            active[tiling] = hash(tuple(coords)) % self.memorySize
+        return active
+
+    def floorTiles(self, floor):
+        temperatureWidth, occupantWidth, outsideWidth = self.widths
+        values = (floor.temperature / temperatureWidth, floor.numOccupants / occupantWidth, floor.outsideTemperature / outsideWidth)
+        return self.tiles(values, (1 if floor.lightStatus else 0,))
+
+
+class SparseLinear:
+    def __init__(self, numFeatures, numActions):
+        """
+        Linear action values or preferences over binary features: the output for an action is the sum of the weights of the
+        active features. Reads and updates cost O(active features * actions), independent of numFeatures.
+
+        Args:
+            numFeatures (int): Number of features, e.g. TileCoder.memorySize.
+            numActions (int): Number of outputs per feature.
+        """
+        self.weights = np.zeros((numFeatures, numActions))
+
+    def values(self, active):
+        return self.weights[active].sum(axis=0)
+
+    def update(self, active, action, delta):
+        # The step is spread over the active features, so delta moves the output by about delta like a table entry would
+        self.weights[active, action] += delta / len(active)
+
+    def updateRow(self, active, deltas):
+        # Moves the outputs of every action at once, e.g. a policy gradient step on the preferences
+        self.weights[active] += deltas / len(active)
@@ -0,0 +1,192 @@
+import json
+import os
+import numpy as np
+
+# Fixed dtype for every recorded column. Per-floor columns get a second dimension of numFloors.
+STEP_COLUMNS = {
+    "episode": np.int32,
+    "step": np.int32,
+    "floor": np.int16,
+    "action": np.int16,
+    "reward": np.float32,
+    "terminated": np.bool_,
+    "totalEnergyUsed": np.float32,
+    "averageComfort": np.float32,
+}
+FLOOR_COLUMNS = {
+    "lightStatus": np.bool_,
+    "temperature": np.float32,
+    "numOccupants": np.int32,
+}
+
+
+def _chunkPath(path, column, chunkIndex):
+    return os.path.join(path, f"{column}.{chunkIndex:05d}.npy")
+
+
+class TrajectoryRecorder:
+    def __init__(self, path, numFloors, chunkSize=65536):
+        """
+        Records every environment step into fixed-dtype columns stored as chunked, memory-mapped .npy files.
+
+        Args:
+            path (str): Directory the columns and metadata are written to. Created if missing.
+            numFloors (int): Number of floors in the recorded building, sets the width of the per-floor columns.
+            chunkSize (int): Number of steps preallocated in each chunk file.
+        """
+        self.path = path
+        self.numFloors = numFloors
+        self.chunkSize = chunkSize
+        os.makedirs(path, exist_ok=True)
+
+        self.numSteps = 0
+        self.episodeStarts = []
+        self.lastEpisode = None
+        self.chunks = []
+        self.chunkRow = chunkSize  # Forces a chunk to be allocated on the first record
+
+    def _newChunk(self):
+        chunkIndex = len(self.chunks)
+        chunk = {}
+        for column, dtype in STEP_COLUMNS.items():
+            chunk[column] = np.lib.format.open_memmap(_chunkPath(self.path, column, chunkIndex), mode="w+", dtype=dtype, shape=(self.chunkSize,))
+        for column, dtype in FLOOR_COLUMNS.items():
+            chunk[column] = np.lib.format.open_memmap(_chunkPath(self.path, column, chunkIndex), mode="w+", dtype=dtype, shape=(self.chunkSize, self.numFloors))
+        # Only the newest chunk is written to, so older ones can be flushed and released
+        if self.chunks:
+            for array in self.chunks[-1].values():
+                array.flush()
+            self.chunks[-1] = None
+        self.chunks.append(chunk)
+        self.chunkRow = 0
+
+    def record(self, episode, step, action, reward, terminated, building):
+        """
+        Appends one step. action is the [floorNum, actionNum] pair passed to Environment.step and building is the state after the step.
+        """
+        if self.chunkRow == self.chunkSize:
+            self._newChunk()
+        if episode != self.lastEpisode:
+            self.episodeStarts.append(self.numSteps)
+            self.lastEpisode = episode
+
+        chunk = self.chunks[-1]
+        row = self.chunkRow
+        chunk["episode"][row] = episode
+        chunk["step"][row] = step
+        chunk["floor"][row] = action[0]
+        chunk["action"][row] = action[1]
+        chunk["reward"][row] = reward
+        chunk["terminated"][row] = terminated
+        chunk["totalEnergyUsed"][row] = building.totalEnergyUsed
+        chunk["averageComfort"][row] = building.averageComfort
+
+        lightRow = chunk["lightStatus"][row]
+        tempRow = chunk["temperature"][row]
+        occupantRow = chunk["numOccupants"][row]
+        for i, floor in enumerate(building.floors):
+            lightRow[i] = floor.lightStatus
+            tempRow[i] = floor.temperature
+            occupantRow[i] = floor.numOccupants
+
+        self.chunkRow += 1
+        self.numSteps += 1
+
+    def flush(self):
+        if self.chunks:
+            for array in self.chunks[-1].values():
+                array.flush()
+        meta = {
+            "numFloors": self.numFloors,
+            "chunkSize": self.chunkSize,
+            "numSteps": self.numSteps,
+            "numChunks": len(self.chunks),
+            "episodeStarts": self.episodeStarts,
+            "stepColumns": {column: np.dtype(dtype).str for column, dtype in STEP_COLUMNS.items()},
+            "floorColumns": {column: np.dtype(dtype).str for column, dtype in FLOOR_COLUMNS.items()},
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def close(self):
+        self.flush()
+        self.chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    def __init__(self, path):
+        """
+        Lazily reads a trajectory written by TrajectoryRecorder. Chunk files are only memory-mapped when a slice touches them.
+
+        Args:
+            path (str): Directory passed to the TrajectoryRecorder.
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.numFloors = meta["numFloors"]
+        self.chunkSize = meta["chunkSize"]
+        self.numSteps = meta["numSteps"]
+        self.columns = list(meta["stepColumns"]) + list(meta["floorColumns"])
+        # Row shape and dtype of every column, for empty slices that don't touch any chunk
+        self._rowFormats = {column: ((), np.dtype(dtype)) for column, dtype in meta["stepColumns"].items()}
+        self._rowFormats.update({column: ((self.numFloors,), np.dtype(dtype)) for column, dtype in meta["floorColumns"].items()})
+        self.episodeStarts = meta["episodeStarts"]
+        self._chunks = {}
+
+    @property
+    def numEpisodes(self):
+        return len(self.episodeStarts)
+
+    def _chunk(self, column, chunkIndex):
+        key = (column, chunkIndex)
+        if key not in self._chunks:
+            self._chunks[key] = np.load(_chunkPath(self.path, column, chunkIndex), mmap_mode="r")
+        return self._chunks[key]
+
+    def column(self, name, start=0, stop=None):
+        """
+        Returns rows [start, stop) of a column. Slices inside one chunk are zero-copy views of the memory map.
+        """
+        if name not in self.columns:
+            raise KeyError(f"Unknown column: {name}")
+        stop = self.numSteps if stop is None else min(stop, self.numSteps)
+        if start >= stop:
+            # Also covers recordings without any step, where no chunk was ever written
+            rowShape, dtype = self._rowFormats[name]
+            return np.empty((0,) + rowShape, dtype=dtype)
+
+        firstChunk = start // self.chunkSize
+        lastChunk = (stop - 1) // self.chunkSize
+        parts = []
+        for chunkIndex in range(firstChunk, lastChunk + 1):
+            chunkStart = chunkIndex * self.chunkSize
+            lo = max(start - chunkStart, 0)
+            hi = min(stop - chunkStart, self.chunkSize)
+            parts.append(self._chunk(name, chunkIndex)[lo:hi])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def episodeBounds(self, episodeIndex):
+        start = self.episodeStarts[episodeIndex]
+        stop = self.episodeStarts[episodeIndex + 1] if episodeIndex + 1 < self.numEpisodes else self.numSteps
+        return start, stop
+
+    def episode(self, episodeIndex, columns=None):
+        """
+        Returns a dict of the requested columns (all by default) for the recorded episode at episodeIndex.
+        """
+        start, stop = self.episodeBounds(episodeIndex)
+        return {name: self.column(name, start, stop) for name in (columns or self.columns)}
+
+    def episodeRewards(self):
+        """
+        Total reward per recorded episode, the same values the algos return as total_rewards.
+        """
+        rewards = self.column("reward")
+        return np.add.reduceat(rewards.astype(np.float64), self.episodeStarts) if self.numSteps else np.zeros(0)
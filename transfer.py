@@ -0,0 +1,60 @@
+import numpy as np
+
+# Names artifacts are stored under, per algorithm
+ARTIFACT_KEYS = {"algo1": ("Q",), "algo2": ("Q1", "Q2"), "algo3": ("theta",)}
+
+
+def saveArtifact(path, algo, *tables):
+    """
+    Stores an algorithm's learned tables with np.savez, e.g. saveArtifact("q.npz", "algo1", Q) or
+    saveArtifact("soft.npz", "algo2", Q1, Q2).
+    """
+    keys = ARTIFACT_KEYS[algo]
+    if len(tables) != len(keys):
+        raise ValueError(f"{algo} artifacts are {keys}, got {len(tables)} tables")
+    np.savez(path, algo=algo, **dict(zip(keys, tables)))
+
+
+def loadArtifact(path):
+    # Returns (algo, {name: table})
+    with np.load(path) as data:
+        algo = str(data["algo"])
+        return algo, {key: data[key] for key in ARTIFACT_KEYS[algo]}
+
+
+def adaptTable(table, numFloors, numActions=None):
+    """
+    Maps a per-floor table of shape (floors, light, temperature bucket, actions) onto a building with numFloors floors.
+    Floors the source building had keep their own entries, extra floors get the mean over the source floors, since the
+    per-floor state and actions mean the same thing in every building.
+
+    For algo1's Q and algo3's theta the action axis is sized by the number of floors, and every action past 3 is a no-op
+    like action 0. Those columns are cut off or filled from the action 0 column to match numActions.
+    """
+    table = np.asarray(table, dtype=np.float64)
+    sourceFloors = table.shape[0]
+    adapted = np.empty((numFloors,) + table.shape[1:])
+    shared = min(sourceFloors, numFloors)
+    adapted[:shared] = table[:shared]
+    adapted[shared:] = table.mean(axis=0)
+
+    if numActions is None or numActions == table.shape[-1]:
+        return adapted
+    resized = np.empty(adapted.shape[:-1] + (numActions,))
+    kept = min(numActions, adapted.shape[-1])
+    resized[..., :kept] = adapted[..., :kept]
+    resized[..., kept:] = adapted[..., :1]
+    return resized
+
+
+def warmStart(path, env):
+    """
+    Loads a stored artifact and adapts it to env's building, ready to pass as algo1's initialQ, algo2's initialQ or
+    algo3's initialTheta.
+    """
+    algo, tables = loadArtifact(path)
+    numFloors = env.building.getNumFloors()
+    # algo2's three per-floor actions don't depend on the building
+    numActions = None if algo == "algo2" else env.numActions
+    adapted = tuple(adaptTable(tables[key], numFloors, numActions) for key in ARTIFACT_KEYS[algo])
+    return adapted if len(adapted) > 1 else adapted[0]